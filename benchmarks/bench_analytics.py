@@ -0,0 +1,78 @@
+"""
+Cost and accuracy of the view analytics.
+
+  record    time per ViewAnalytics.record() call, the only part on the request path
+  request   GET /{slug} latency in-process with ANALYTICS on and off, interleaved
+  flush     time to roll --apps apps' pending minutes up into the database
+  uniques   HyperLogLog estimate against the true number of distinct visitors,
+            and the bytes its sketch takes in a rollup row
+
+    python -m benchmarks.bench_analytics [--apps 200] [--requests 2000]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import configure, percentile, seed_apps
+
+
+def scope(visitor: int):
+    return {"client": (f"10.{visitor >> 16 & 255}.{visitor >> 8 & 255}.{visitor & 255}", 1234),
+            "headers": [(b"user-agent", b"Mozilla/5.0 (bench)")]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Flushed by hand below, never by the background thread
+        configure(Path(tmp), ANALYTICS_FLUSH_INTERVAL=3600)
+        from fastapi.testclient import TestClient
+        from src.config import config
+        from src.services.analytics import analytics
+        from src.utils.hll import HyperLogLog
+        import main as app_module
+
+        scopes = [scope(i) for i in range(10000)]
+        calls = 200000
+        start = time.perf_counter()
+        for i in range(calls):
+            analytics.record(f"app-{i % args.apps}", scopes[i % len(scopes)])
+        per_call = (time.perf_counter() - start) / calls
+        print(f"record    {per_call * 1e9:>8.0f} ns/call")
+
+        start = time.perf_counter()
+        analytics.flush()
+        print(f"flush     {(time.perf_counter() - start) * 1000:>8.1f} ms for {args.apps} apps")
+
+        slugs = seed_apps(4, comments_per_app=0)
+        with TestClient(app_module.app) as client:
+            latencies = {True: [], False: []}
+            for i in range(args.requests):
+                enabled = i % 2 == 0
+                config._config["ANALYTICS"] = enabled
+                start = time.perf_counter()
+                response = client.get(f"/{slugs[i % len(slugs)]}")
+                latencies[enabled].append(time.perf_counter() - start)
+                assert response.status_code == 200
+            for enabled in (False, True):
+                samples = latencies[enabled]
+                print(f"request   analytics {'on ' if enabled else 'off'} "
+                      f"p50 {statistics.median(samples) * 1000:.3f} ms  p99 {percentile(samples, 0.99) * 1000:.3f} ms")
+
+        print(f"\n{'visitors':>9} {'estimate':>9} {'error':>7} {'bytes':>6}")
+        for visitors in (10, 100, 1000, 10000, 100000):
+            sketch = HyperLogLog()
+            for i in range(visitors):
+                sketch.add(f"visitor-{i}".encode())
+            estimate = sketch.count()
+            print(f"{visitors:>9} {estimate:>9} {estimate / visitors - 1:>+7.1%} {len(sketch.to_bytes()):>6}")
+
+
+if __name__ == "__main__":
+    main()
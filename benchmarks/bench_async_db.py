@@ -0,0 +1,112 @@
+"""
+Static-serving latency while database writes are in flight.
+
+Drives the FastAPI app in-process and measures p50/p99 latency of GET
+/{slug}/{asset} on its own, then again while other clients keep posting
+comments. Use --write-delay-ms to simulate a slow disk: because writes run
+on the database writer thread, static p99 should barely move.
+
+    python -m benchmarks.bench_async_db [--requests 2000] [--writers 4] [--write-delay-ms 50]
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import configure
+from src.config import config
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def static_load(client, requests: int, concurrency: int):
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.get("/bench/app.js")
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200
+            # A cached GET never suspends, so without this the workers would
+            # run to completion before a writer got another turn
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+async def write_load(client, stop: asyncio.Event, counter: list):
+    while not stop.is_set():
+        response = await client.post("/api/comment/bench", data={"content": "benchmark", "author": "bench"})
+        assert response.status_code == 303, f"comment POST -> {response.status_code}"
+        counter[0] += 1
+
+
+def report(label: str, latencies):
+    print(f"{label:<24} p50 {statistics.median(latencies) * 1000:7.2f} ms   p99 {percentile(latencies, 0.99) * 1000:7.2f} ms")
+
+
+async def run(args):
+    import httpx
+    from main import app
+    from src.database import db
+
+    db.create_app(slug="bench", name="Bench", description="benchmark", author="bench")
+    site = config.upload_dir / "bench"
+    site.mkdir(parents=True)
+    (site / "index.html").write_text("<html><script src='app.js'></script></html>")
+    (site / "app.js").write_text("console.log('bench');\n" * 200)
+
+    if args.write_delay_ms:
+        original = db.add_comment
+
+        def slow_add_comment(*a, **kw):
+            time.sleep(args.write_delay_ms / 1000)
+            return original(*a, **kw)
+
+        db.add_comment = slow_add_comment
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await static_load(client, 100, args.concurrency)  # warm up caches
+        report("static only", await static_load(client, args.requests, args.concurrency))
+
+        stop, writes = asyncio.Event(), [0]
+        writers = [asyncio.create_task(write_load(client, stop, writes)) for _ in range(args.writers)]
+        start = time.perf_counter()
+        latencies = await static_load(client, args.requests, args.concurrency)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*writers)
+        report(f"static + {args.writers} writers", latencies)
+        print(f"comments written during run: {writes[0]} ({writes[0] / elapsed:.0f}/s)")
+        if writes[0] <= args.writers:
+            raise RuntimeError("writers did not overlap the static load; the row above measured no writes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--write-delay-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Also turns rate limiting off: writers post far faster than the comment limit allows
+        configure(Path(tmp))
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
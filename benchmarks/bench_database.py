@@ -0,0 +1,110 @@
+"""
+Reads/writes per second for the Database layer.
+
+Compares the previous connect-per-call access pattern (new sqlite3 connection
+and rollback journal for every statement) against the pooled WAL connections.
+Pooled view counts are buffered, so their timing includes the batched flush
+that writes them.
+
+    python -m benchmarks.bench_database [--apps 1000] [--ops 5000]
+"""
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import configure
+
+
+class LegacyDatabase:
+    """The access pattern Database used before connections were pooled."""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def get_app(self, slug: str):
+        conn = self._get_connection()
+        row = conn.execute("SELECT * FROM apps WHERE slug = ?", (slug,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
+
+    def increment_view_count(self, slug: str):
+        conn = self._get_connection()
+        conn.execute("UPDATE apps SET view_count = view_count + 1 WHERE slug = ?", (slug,))
+        conn.commit()
+        conn.close()
+
+
+def seed(db_path: Path, count: int):
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO apps (slug, name, description, author) VALUES (?, ?, ?, ?)",
+        [(f"app{i}", f"App {i}", "benchmark app", "bench") for i in range(count)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def measure(label: str, fn, slugs, ops: int, finish=None) -> float:
+    """ops calls of fn, plus finish() (e.g. flushing buffered writes) inside the timing."""
+    start = time.perf_counter()
+    for _ in range(ops):
+        fn(random.choice(slugs))
+    if finish is not None:
+        finish()
+    elapsed = time.perf_counter() - start
+    rate = ops / elapsed
+    print(f"{label:<32} {rate:>12,.0f} ops/s")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", type=int, default=1000)
+    parser.add_argument("--ops", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = Path(tmp) / "legacy.db"
+        pooled_path = Path(tmp) / "pooled.db"
+
+        configure(Path(tmp), DB_PATH=str(pooled_path))
+        from src.database import Database
+
+        pooled = Database()
+        seed(pooled_path, args.apps)
+
+        # Same schema, but left in the default rollback-journal mode
+        conn = sqlite3.connect(legacy_path)
+        conn.executescript(
+            "".join(f"{row[0]};" for row in sqlite3.connect(pooled_path).execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name IN ('apps', 'comments')"
+            ))
+        )
+        conn.close()
+        seed(legacy_path, args.apps)
+        legacy = LegacyDatabase(legacy_path)
+
+        slugs = [f"app{i}" for i in range(args.apps)]
+        results = {
+            "read": (measure("legacy get_app", legacy.get_app, slugs, args.ops),
+                     measure("pooled get_app", pooled.get_app, slugs, args.ops)),
+            "write": (measure("legacy increment_view_count", legacy.increment_view_count, slugs, args.ops),
+                      measure("pooled increment_view_count", pooled.increment_view_count, slugs, args.ops,
+                              finish=pooled.views.flush)),
+        }
+        pooled.close()
+
+    for kind, (before, after) in results.items():
+        print(f"{kind}: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Hammer a slug with requests while it is being redeployed.
+
+Readers fetch /{slug}/ and /{slug}/app.js concurrently while the site is
+redeployed repeatedly through FileService.save_upload. Every response must be
+a 200 carrying one complete version; any 404 or torn body is reported. The
+in-memory file cache is disabled so every request goes to the filesystem.
+
+    python -m benchmarks.bench_redeploy [--deploys 20] [--readers 16] [--files 200]
+"""
+import argparse
+import asyncio
+import io
+import re
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from benchmarks.common import configure
+
+
+def build_zip(version: int, files: int) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("index.html", f"<html><!-- version {version} --><script src='app.js'></script></html>")
+        zf.writestr("app.js", f"/* version {version} */\n" + "console.log('x');\n" * 2000)
+        for i in range(files):
+            zf.writestr(f"assets/file{i}.txt", f"version {version} file {i}\n" * 50)
+    return buf.getvalue()
+
+
+async def run(args):
+    import httpx
+    from fastapi import UploadFile
+    from main import app
+    from src.services.file_service import FileService
+
+    async def deploy(version: int):
+        upload = UploadFile(file=io.BytesIO(build_zip(version, args.files)), filename="site.zip")
+        await FileService.save_upload(slug="hot", file=upload)
+
+    await deploy(0)
+    failures, ok = [], [0]
+    done = asyncio.Event()
+
+    async def reader(client):
+        while not done.is_set():
+            for path, pattern in (("/hot/", rb"<!-- version (\d+) -->"), ("/hot/app.js", rb"/\* version (\d+) \*/")):
+                response = await client.get(path)
+                complete = response.status_code == 200 and re.search(pattern, response.content)
+                if path.endswith(".js") and complete:
+                    complete = response.content.count(b"console.log") == 2000
+                if complete:
+                    ok[0] += 1
+                else:
+                    failures.append((path, response.status_code, len(response.content)))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        readers = [asyncio.create_task(reader(client)) for _ in range(args.readers)]
+        start = time.perf_counter()
+        for version in range(1, args.deploys + 1):
+            await deploy(version)
+        elapsed = time.perf_counter() - start
+        done.set()
+        await asyncio.gather(*readers)
+
+    print(f"{args.deploys} deploys in {elapsed:.1f}s, {ok[0]} complete responses, {len(failures)} failures")
+    for failure in failures[:10]:
+        print("  failed:", failure)
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deploys", type=int, default=20)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--files", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure(Path(tmp), SITE_CACHE_MAX_FILE_SIZE=0)
+        raise SystemExit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Search latency over a large catalogue.
+
+Seeds a temporary database with --apps rows and times /api/search's query
+(Database.search_apps, FTS5 + bm25) against a newest-first LIKE scan over
+the same columns, which is what matching without the index costs. The LIKE
+scan stops early on common words but reads the whole table for rare ones.
+
+It also checks that the best match is found however old it is: the oldest
+app is made the best match for the most common word and must rank first.
+
+    python -m benchmarks.bench_search [--apps 100000] [--queries 200]
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import string
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import configure
+
+CJK_WORDS = ["翻译助手", "记账本", "番茄时钟", "天气预报", "简历生成", "海报设计", "单词卡片", "思维导图"]
+
+
+def vocabulary(rng: random.Random, size: int):
+    words = {"".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))) for _ in range(size * 2)}
+    return sorted(words)[:size] + CJK_WORDS
+
+
+def seed(db_path: Path, count: int):
+    rng = random.Random(42)
+    words = vocabulary(rng, 5000)
+    # Zipf-like: a few words are everywhere, most are rare, as in real descriptions
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    authors = ["".join(rng.choices(string.ascii_lowercase, k=6)) for _ in range(2000)]
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO apps (slug, name, description, author) VALUES (?, ?, ?, ?)",
+            [
+                (
+                    f"app{i}",
+                    " ".join(rng.choices(words, weights, k=2)) + f" {i}",
+                    " ".join(rng.choices(words, weights, k=12)),
+                    rng.choice(authors),
+                )
+                for i in range(count)
+            ],
+        )
+    conn.close()
+
+
+def like_scan(conn: sqlite3.Connection, query: str):
+    terms = query.split()
+    where = " AND ".join("(name LIKE ? OR description LIKE ? OR author LIKE ?)" for _ in terms)
+    params = [f"%{term}%" for term in terms for _ in range(3)]
+    return conn.execute(f"SELECT * FROM apps WHERE {where} ORDER BY created_at DESC LIMIT 24", params).fetchall()
+
+
+def report(label: str, timings):
+    timings = sorted(timings)
+    p50 = statistics.median(timings) * 1000
+    p99 = timings[int(len(timings) * 0.99) - 1] * 1000
+    print(f"{label:<28} p50 {p50:8.2f} ms   p99 {p99:8.2f} ms")
+    return p50, p99
+
+
+def timed(fn, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "search.db"
+        configure(Path(tmp), DB_PATH=str(db_path))
+        from src.database import Database
+
+        database = Database()
+        start = time.perf_counter()
+        seed(db_path, args.apps)
+        print(f"seeded {args.apps:,} apps in {time.perf_counter() - start:.1f}s (FTS kept in sync by triggers)")
+
+        conn = sqlite3.connect(db_path)
+        names = [row[0] for row in conn.execute("SELECT name FROM apps ORDER BY random() LIMIT ?", (args.queries,))]
+        rng = random.Random(7)
+        # One or two words taken from real app names, from very common to rare
+        queries = [" ".join(rng.sample(name.split()[:2], rng.randint(1, 2))) for name in names]
+        baseline = report("LIKE scan (newest 24)", timed(lambda q: like_scan(conn, q), queries))
+        fts = report("search_apps (ranked, 24)", timed(lambda q: database.search_apps(q, limit=25), queries))
+        report("get_app_by_name", timed(database.get_app_by_name, names))
+
+        common = vocabulary(random.Random(42), 5000)[0]
+        with conn:
+            conn.execute("UPDATE apps SET name = ?, description = ? WHERE slug = 'app0'", (f"{common} {common}", common))
+        matches = conn.execute("SELECT COUNT(*) FROM apps_fts WHERE apps_fts MATCH ?", (f'"{common}"',)).fetchone()[0]
+        best = database.search_apps(common, limit=1)
+        if not best or best[0]["slug"] != "app0":
+            raise SystemExit(f"oldest best match for {common!r} missing from {matches:,} matches")
+        print(f"oldest best match ranked first among {matches:,} matches")
+        conn.close()
+        database.close()
+
+    print(f"search vs LIKE: p50 {baseline[0] / fts[0]:.1f}x, p99 {baseline[1] / fts[1]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
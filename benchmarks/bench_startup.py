@@ -0,0 +1,132 @@
+"""
+Startup time: from launching a worker to its first 200 response.
+
+Each run starts uvicorn in a fresh process and polls GET / until it answers
+200. "cold" starts against an empty data directory, so the schema is created
+from scratch; "warm" restarts against the database the cold run left, which
+is what every worker restart pays. "import" is the time `import main` takes
+inside the process, without the server around it.
+
+Results are compared against benchmarks/startup_baseline.json; a scenario
+regresses when its median grows by more than --tolerance.
+
+    python -m benchmarks.bench_startup                   # compare against the baseline
+    python -m benchmarks.bench_startup --save-baseline   # record a new baseline
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from benchmarks.common import REPO_ROOT, configure, free_port, stop_server
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "startup_baseline.json"
+
+
+def first_response(workdir: Path, settings, timeout: float = 30) -> float:
+    """Seconds from spawning the server until GET / returns 200."""
+    port = free_port()
+    (workdir / "config.json").write_text(json.dumps(settings, indent=4))
+    for name in ("templates", "static"):
+        link = workdir / name
+        if not link.exists() and (REPO_ROOT / name).exists():
+            link.symlink_to(REPO_ROOT / name, target_is_directory=True)
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(REPO_ROOT),
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        cwd=workdir, env=dict(os.environ, PYTHONPATH=str(REPO_ROOT)),
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with code {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.005)
+        raise RuntimeError("server did not answer in time")
+    finally:
+        stop_server(process)
+
+
+def import_time(workdir: Path) -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=workdir, env=dict(os.environ, PYTHONPATH=str(REPO_ROOT)),
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure(runs: int):
+    samples = {"cold": [], "warm": [], "import": []}
+    for _ in range(runs):
+        tmp = Path(tempfile.mkdtemp(prefix="ahost-startup-"))
+        try:
+            settings = configure(tmp / "data")
+            samples["cold"].append(first_response(tmp, settings))
+            samples["warm"].append(first_response(tmp, settings))
+            samples["import"].append(import_time(tmp))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return {
+        name: {"median_ms": round(statistics.median(values) * 1000, 1),
+               "min_ms": round(min(values) * 1000, 1)}
+        for name, values in samples.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    print(f"{'scenario':<8} {'median ms':>10} {'min ms':>8}")
+    for name, result in results.items():
+        print(f"{name:<8} {result['median_ms']:>10} {result['min_ms']:>8}")
+
+    run = {"python": platform.python_version(), "runs": args.runs, "results": results}
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(run, indent=2) + "\n")
+        print(f"\nbaseline written to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"\nno baseline at {args.baseline}; record one with --save-baseline")
+        return
+
+    baseline = json.loads(args.baseline.read_text())
+    regressed = False
+    print(f"\n{'scenario':<8} {'vs baseline':>12}")
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            print(f"{name:<8} {'(no baseline)':>12}")
+            continue
+        change = result["median_ms"] / base["median_ms"] - 1
+        slower = change > args.tolerance
+        regressed |= slower
+        print(f"{name:<8} {change:>+11.0%}{'  REGRESSION' if slower else ''}")
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Peak RSS while ingesting a large zip upload through FileService.save_upload.
+
+Builds an archive of incompressible data (default 500 MB) in a temporary
+directory and reports how much the process's peak RSS grew while it was
+streamed to disk and extracted. With chunked I/O the growth should stay in
+the low megabytes regardless of archive size.
+
+    python -m benchmarks.bench_upload_memory [--size-mb 500]
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from benchmarks.common import configure
+from src.config import config
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def build_archive(path: Path, size_mb: int):
+    chunk = os.urandom(1024 * 1024)
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as zf:
+        zf.writestr("site/index.html", "<html><body>large</body></html>")
+        with zf.open("site/data.bin", "w", force_zip64=True) as member:
+            for _ in range(size_mb):
+                member.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        configure(
+            tmp,
+            MAX_UPLOAD_SIZE=(args.size_mb + 16) * 1024 * 1024,
+            ZIP_MAX_UNCOMPRESSED_SIZE=(args.size_mb + 16) * 1024 * 1024,
+        )
+        from fastapi import UploadFile
+        from src.services.file_service import FileService
+
+        archive = tmp / "upload.zip"
+        build_archive(archive, args.size_mb)
+
+        before = peak_rss_mb()
+        start = time.perf_counter()
+        with open(archive, "rb") as f:
+            upload = UploadFile(file=f, filename="upload.zip")
+            asyncio.run(FileService.save_upload(slug="large", file=upload))
+        elapsed = time.perf_counter() - start
+        after = peak_rss_mb()
+
+        extracted = (config.upload_dir / "large" / "data.bin").stat().st_size
+        print(f"archive:        {archive.stat().st_size / 1024 / 1024:,.0f} MB")
+        print(f"extracted:      {extracted / 1024 / 1024:,.0f} MB in {elapsed:.1f}s")
+        print(f"peak RSS:       {before:,.1f} MB -> {after:,.1f} MB (+{after - before:,.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Read throughput as the number of uvicorn workers grows.
+
+Seeds --apps synthetic apps once, then for each worker count in --workers
+starts the app on that data and drives hosted pages, assets and showcase
+pages from --clients load-generating processes (one asyncio client alone
+tops out well before several workers do). Scaling is bounded by the cores
+of the machine, which are shared with the clients.
+
+    python -m benchmarks.bench_workers [--workers 1,2,4] [--clients 4]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import configure, free_port, seed_apps, start_server, stop_server, summarize
+
+
+def client(url: str, paths, count: int, concurrency: int, seed: int):
+    """One load-generating process: returns (latencies, elapsed)."""
+    import httpx
+
+    rng = random.Random(seed)
+    latencies = []
+
+    async def worker(client, remaining):
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            response = await client.get(rng.choice(paths))
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{response.request.url} -> {response.status_code}")
+
+    async def run():
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60,
+                                     headers={"Accept-Encoding": "gzip"}) as client:
+            remaining = [count]
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(client, remaining) for _ in range(concurrency)))
+            return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    return latencies, elapsed
+
+
+def measure(url: str, paths, args):
+    per_client = args.requests // args.clients
+    with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+        # Warm every worker's caches before timing
+        pool.starmap(client, [(url, paths, 200, args.concurrency, n) for n in range(args.clients)])
+        runs = pool.starmap(client, [(url, paths, per_client, args.concurrency, n) for n in range(args.clients)])
+    latencies = [latency for run, _ in runs for latency in run]
+    return summarize(latencies, max(elapsed for _, elapsed in runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=8000, help="requests per worker count")
+    parser.add_argument("--workers", type=lambda s: [int(n) for n in s.split(",")], default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--concurrency", type=int, default=16, help="connections per client process")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} client processes x {args.concurrency} connections")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        settings = configure(tmp, concurrency=args.clients * args.concurrency)
+        slugs = seed_apps(args.apps)
+        from src.database import db
+        db.views.stop()
+        db.close()
+
+        paths = [f"/{slug}" for slug in slugs] + [f"/{slug}/app.js" for slug in slugs] + [f"/i/{slug}" for slug in slugs]
+        baseline = None
+        for workers in args.workers:
+            port = free_port()
+            server = start_server(tmp / "server", settings, port, workers=workers)
+            try:
+                result = measure(f"http://127.0.0.1:{port}", paths, args)
+            finally:
+                stop_server(server)
+            baseline = baseline or result["rps"]
+            print(f"workers {workers:>2}   {result['rps']:>9,.1f} req/s ({result['rps'] / baseline:4.2f}x)"
+                  f"   p50 {result['p50_ms']:7.2f} ms   p99 {result['p99_ms']:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Time zip extraction for uploads with many files.
+
+Builds archives of --files small files (default 10000) in the layouts people
+actually upload and times FileService._extract_zip on each, after the zip has
+been streamed to disk:
+
+  flat     index.html at the root
+  folder   everything inside one top-level folder, plus __MACOSX junk
+  entry    one top-level folder whose page is not called index.html
+
+    python -m benchmarks.bench_zip_extract [--files 10000] [--rounds 3]
+"""
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from benchmarks.common import configure
+
+
+def build_zip(path: Path, layout: str, files: int):
+    prefix = "" if layout == "flat" else "my-site/"
+    page = "home.html" if layout == "entry" else "index.html"
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(prefix + page, "<html><script src='app.js'></script></html>")
+        zf.writestr(prefix + "app.js", "console.log('x');\n" * 200)
+        for i in range(files):
+            # A few hundred files per directory, like a bundler's output
+            zf.writestr(f"{prefix}assets/{i // 250}/file{i}.txt", f"file {i}\n" * 20)
+            if layout == "folder" and i % 10 == 0:
+                zf.writestr(f"__MACOSX/{prefix}assets/{i // 250}/._file{i}.txt", b"\0" * 82)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        configure(tmp, ZIP_MAX_MEMBERS=args.files * 2 + 100)
+        from src.services.file_service import FileService
+
+        print(f"{'layout':<8} {'files':>7} {'median s':>9} {'files/s':>9}")
+        for layout in ("flat", "folder", "entry"):
+            archive = tmp / f"{layout}.zip"
+            build_zip(archive, layout, args.files)
+            timings = []
+            for round_ in range(args.rounds):
+                target = tmp / f"out-{layout}-{round_}"
+                target.mkdir()
+                start = time.perf_counter()
+                FileService._extract_zip(archive, target)
+                timings.append(time.perf_counter() - start)
+                assert (target / "index.html").is_file(), f"{layout}: no index.html after extraction"
+                shutil.rmtree(target)
+            median = statistics.median(timings)
+            print(f"{layout:<8} {args.files:>7} {median:>9.3f} {args.files / median:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Shared helpers for the benchmark scripts: an isolated data directory,
+synthetic apps deployed through the real publish path, latency statistics
+and a local uvicorn server.
+
+Call configure() before importing anything that reads paths from config
+(src.database, src.utils.logger, main, ...), since those modules create
+their singletons at import time.
+"""
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.config import config
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+UPLOAD_PASSWORD = "bench"
+
+
+def configure(tmp: Path, concurrency: int = 16, **overrides) -> Dict[str, Any]:
+    """
+    Point every path in config at tmp and return the settings used.
+    concurrency is the most requests the benchmark has in flight at once.
+    """
+    settings = {
+        "UPLOAD_DIR": str(tmp / "sites"),
+        "DB_PATH": str(tmp / "db" / "app.db"),
+        "STORE_DIR": str(tmp / "store"),
+        "QR_CACHE_DIR": str(tmp / "cache" / "qr"),
+        "TEMPLATE_CACHE_DIR": str(tmp / "cache" / "jinja"),
+        "LOG_PATH": str(tmp / "logs" / "app.log"),
+        "ACCESS_LOG_PATH": str(tmp / "logs" / "access.log"),
+        "UPLOAD_PASSWORD": UPLOAD_PASSWORD,
+        "LOG_LEVEL": "ERROR",
+        "CF_ZONE_ID": "",
+        "CF_API_TOKEN": "",
+        # Every request comes from one client; measure throughput, not the limiter
+        "RATE_LIMIT": False,
+        # Nor the upload cap: every client may be uploading at once
+        "MAX_CONCURRENT_UPLOADS": concurrency,
+        **overrides,
+    }
+    config._config.update(settings)
+    return settings
+
+
+def site_files(index: int) -> Dict[str, bytes]:
+    """A small but realistic site: an HTML page plus a script and a stylesheet."""
+    return {
+        "index.html": (
+            f"<!DOCTYPE html><html><head><title>App {index}</title>"
+            "<link rel='stylesheet' href='style.css'></head>"
+            f"<body><h1>App {index}</h1>" + "<p>Lorem ipsum dolor sit amet.</p>" * 40 +
+            "<script src='app.js'></script></body></html>"
+        ).encode(),
+        "app.js": ("function tick(n) { return n + 1; }\n" * 300).encode(),
+        "style.css": ("body { margin: 0; font-family: sans-serif; }\n" * 100).encode(),
+    }
+
+
+def site_zip(index: int) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in site_files(index).items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def seed_apps(count: int, comments_per_app: int = 3) -> List[str]:
+    """Create count apps, each deployed through FileService's publish path."""
+    from src.database import db
+    from src.services.blob_store import blob_store
+    from src.services.file_service import FileService
+    from src.services.site_cache import precompress_site
+
+    slugs = []
+    for i in range(count):
+        slug = f"bench{i}"
+        staging_dir = blob_store.new_staging_dir(slug)
+        for name, data in site_files(i).items():
+            (staging_dir / name).write_bytes(data)
+        precompress_site(staging_dir)
+        FileService._commit_staged(slug, staging_dir)
+        db.create_app(slug=slug, name=f"Bench App {i}", description="synthetic benchmark app", author="bench")
+        for n in range(comments_per_app):
+            db.add_comment(slug, f"comment {n}", "bench")
+        slugs.append(slug)
+    return slugs
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workdir: Path, settings: Dict[str, Any], port: int, workers: int = 1,
+                 command: Optional[List[str]] = None) -> subprocess.Popen:
+    """
+    Run the app under uvicorn with workdir as its working directory, using
+    settings as its config.json. Templates and static files are linked in
+    from the repository since the app loads them by relative path.
+    """
+    workdir.mkdir(parents=True, exist_ok=True)
+    (workdir / "config.json").write_text(json.dumps(settings, indent=4))
+    for name in ("templates", "static"):
+        link = workdir / name
+        if not link.exists() and (REPO_ROOT / name).exists():
+            link.symlink_to(REPO_ROOT / name, target_is_directory=True)
+
+    command = command or [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--app-dir", str(REPO_ROOT), "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+    ]
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT))
+    process = subprocess.Popen(command, cwd=workdir, env=env)
+    wait_for_port(port, process)
+    return process
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"server did not start listening on port {port}")
+
+
+def stop_server(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
@@ -0,0 +1,208 @@
+"""
+Throughput and latency of the main routes, compared against a baseline.
+
+Seeds a temporary UPLOAD_DIR/DB_PATH/STORE_DIR with --apps synthetic apps,
+then drives each scenario with --concurrency clients, either in-process
+through httpx's ASGI transport (default) or over HTTP against a local
+uvicorn started on the same data (--server). Results are compared with
+the stored baseline; a scenario regresses when its p99 grows or its
+throughput drops by more than --tolerance.
+
+    python -m benchmarks.run [--server] [--workers 1] [--only root,asset]
+    python -m benchmarks.run --save-baseline      # record a new baseline
+
+Scenarios: root (/{slug}), asset (/{slug}/app.js), showcase (/i/{slug}),
+home (/), comment (POST /api/comment/{slug}), upload (POST /api/upload).
+Baselines are machine-specific: record one on the machine you compare on.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import (
+    UPLOAD_PASSWORD, configure, free_port, seed_apps, site_zip, start_server, stop_server, summarize,
+)
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+# Served variants are still picked by Accept-Encoding; gzip just keeps the
+# client's own decoding cost (brotlicffi is slow) out of the numbers
+CLIENT_HEADERS = {"Accept-Encoding": "gzip"}
+
+
+def scenarios(slugs, rng: random.Random):
+    """name -> (request count multiplier, coroutine issuing one request)"""
+    upload_body = site_zip(0)
+
+    async def root(client):
+        return await client.get(f"/{rng.choice(slugs)}")
+
+    async def asset(client):
+        return await client.get(f"/{rng.choice(slugs)}/app.js")
+
+    async def showcase(client):
+        return await client.get(f"/i/{rng.choice(slugs)}")
+
+    async def home(client):
+        return await client.get("/")
+
+    async def comment(client):
+        return await client.post(f"/api/comment/{rng.choice(slugs)}", data={"content": "bench", "author": "bench"})
+
+    async def upload(client):
+        # Redeploys onto a small set of slugs, so this measures the full
+        # extract + ingest + publish path rather than creating endless apps
+        return await client.post(
+            "/api/upload",
+            data={"name": "Upload Bench", "author": "bench", "password": UPLOAD_PASSWORD,
+                  "slug": f"upload{rng.randrange(8)}"},
+            files={"file": ("site.zip", upload_body, "application/zip")},
+        )
+
+    return {
+        "root": (1, root),
+        "asset": (1, asset),
+        "showcase": (1, showcase),
+        "home": (1, home),
+        "comment": (0.25, comment),
+        "upload": (0.05, upload),
+    }
+
+
+async def drive(client, request, count: int, concurrency: int):
+    latencies = []
+    remaining = [count]
+
+    async def worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            response = await request(client)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{response.request.method} {response.request.url} -> {response.status_code}")
+            # In-process requests that never block would otherwise run back to
+            # back in one task and charge the wait to every other client
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def run_scenarios(client, slugs, args):
+    rng = random.Random(1)
+    results = {}
+    for name, (weight, request) in scenarios(slugs, rng).items():
+        if args.only and name not in args.only:
+            continue
+        count = max(args.concurrency, int(args.requests * weight))
+        await drive(client, request, min(count, 50), args.concurrency)  # warm caches
+        results[name] = await drive(client, request, count, args.concurrency)
+        r = results[name]
+        print(f"{name:<10} {r['rps']:>9,.1f} req/s   p50 {r['p50_ms']:8.2f} ms   p99 {r['p99_ms']:8.2f} ms")
+    return results
+
+
+async def run_in_process(slugs, args):
+    import httpx
+    from main import app, lifespan
+
+    transport = httpx.ASGITransport(app=app)
+    async with lifespan(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=CLIENT_HEADERS) as client:
+            return await run_scenarios(client, slugs, args)
+
+
+async def run_against(url: str, slugs, args):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60, headers=CLIENT_HEADERS) as client:
+        return await run_scenarios(client, slugs, args)
+
+
+def compare(results, baseline, tolerance: float) -> bool:
+    """Print the change against baseline per scenario; True if anything regressed."""
+    regressed = False
+    print(f"\n{'scenario':<10} {'req/s':>10} {'p50':>9} {'p99':>9}   vs baseline")
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            print(f"{name:<10} {'(no baseline)':>30}")
+            continue
+        rps = result["rps"] / base["rps"] - 1
+        p50 = result["p50_ms"] / base["p50_ms"] - 1
+        p99 = result["p99_ms"] / base["p99_ms"] - 1
+        slower = rps < -tolerance or p99 > tolerance
+        regressed |= slower
+        print(f"{name:<10} {rps:>+9.0%} {p50:>+9.0%} {p99:>+9.0%}   {'REGRESSED' if slower else 'ok'}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per read scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--server", action="store_true", help="benchmark a local uvicorn instead of in-process")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --server")
+    parser.add_argument("--only", type=lambda s: set(s.split(",")), default=None)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--output", type=Path, help="also write this run's results here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        settings = configure(tmp, concurrency=args.concurrency)
+        start = time.perf_counter()
+        slugs = seed_apps(args.apps)
+        print(f"seeded {len(slugs)} apps in {time.perf_counter() - start:.1f}s")
+
+        if args.server:
+            from src.database import db
+            db.views.stop()
+            db.close()
+            port = free_port()
+            server = start_server(tmp / "server", settings, port, workers=args.workers)
+            try:
+                results = asyncio.run(run_against(f"http://127.0.0.1:{port}", slugs, args))
+            finally:
+                stop_server(server)
+        else:
+            results = asyncio.run(run_in_process(slugs, args))
+
+    run = {
+        "mode": f"server x{args.workers}" if args.server else "in-process",
+        "python": platform.python_version(),
+        "apps": args.apps,
+        "concurrency": args.concurrency,
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(run, indent=2) + "\n")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(run, indent=2) + "\n")
+        print(f"\nbaseline written to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\nno baseline at {args.baseline}; record one with --save-baseline")
+        return
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("mode") != run["mode"]:
+        print(f"\nnote: baseline was recorded {baseline.get('mode')}, this run is {run['mode']}")
+    if compare(results, baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
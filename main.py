@@ -1,10 +1,76 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from src.routes import admin, showcase, serve
-from src.utils.logger import logger
+from src.database import db, async_db
+from src.services.asset_optimizer import AssetOptimizer
+from src.services.analytics import analytics
+from src.services.broadcast import broadcast
+from src.services.cloudflare_service import CloudflareService
+from src.config import config
+from src.utils.logger import logger, access_log
+from src.utils.metrics import HTTP_LATENCY, HTTP_REQUESTS, registry
+from src.utils.rate_limit import HeavyOperationMiddleware, RateLimitMiddleware
 
-app = FastAPI(title="AI 产品库")
+class MetricsMiddleware:
+    """
+    Record request counts and latency per route template (e.g. /i/{slug}),
+    not per URL, and hand each request to the access log.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the shared scope
+            route = scope.get("route")
+            template = getattr(route, "path", None) or ("/static" if scope["path"].startswith("/static/") else "<unmatched>")
+            duration = time.perf_counter() - start
+            HTTP_LATENCY.observe(duration, method=scope["method"], route=template)
+            HTTP_REQUESTS.inc(method=scope["method"], route=template, status=status)
+            access_log.record(scope, template, status, duration, size)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await broadcast.start()
+    yield
+    await broadcast.stop()
+    await CloudflareService.stop()
+    AssetOptimizer.shutdown()
+    # Let queued writes finish, then write out buffered view counts
+    async_db.shutdown()
+    analytics.stop()
+    db.views.stop()
+    db.close()
+    logger.info("Application stopped")
+    # Drain the queued log sinks
+    await logger.complete()
+
+app = FastAPI(title="AI 产品库", lifespan=lifespan)
+# Outermost last: requests turned away by the rate limiter are still counted
+app.add_middleware(HeavyOperationMiddleware)
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Ensure static directory exists
 Path("static").mkdir(exist_ok=True)
@@ -25,10 +91,33 @@ from fastapi.responses import PlainTextResponse
 async def wechat_verify():
     return "9ddf2eeaedd2be5c84577b229e14e6a193b52c5c"
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    if config.metrics_token and request.headers.get("authorization") != f"Bearer {config.metrics_token}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 app.include_router(serve.router)
 
 logger.info("Application started")
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+
+    parser = argparse.ArgumentParser(description="Run the AHost server")
+    parser.add_argument("--host", default=config.host)
+    parser.add_argument("--port", type=int, default=config.port)
+    parser.add_argument("--workers", type=int, default=config.workers,
+                        help="worker processes; caches stay in sync through the database")
+    parser.add_argument("--reload", action="store_true", help="restart on code changes (development, one worker)")
+    args = parser.parse_args()
+
+    if args.reload:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
+    elif args.workers > 1:
+        # The schema is already migrated by this process's import of the app,
+        # so workers start against an up-to-date database
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run(app, host=args.host, port=args.port)
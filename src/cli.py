@@ -0,0 +1,72 @@
+"""
+Command line tools for AHost, run from the project root:
+
+    python -m src.cli import backup.tar.gz     # or a directory with apps.json or apps/
+    python -m src.cli export backup.tar.gz     # "-" writes the tar to stdout
+
+Safe to run next to a live server: other processes pick up the changes
+through the events table.
+"""
+import argparse
+import asyncio
+import json
+import shutil
+import sys
+from pathlib import Path
+from fastapi import HTTPException
+from src.database import db
+from src.services.blob_store import blob_store
+from src.services.bulk_service import BulkService
+from src.services.cloudflare_service import CloudflareService
+
+def import_apps(source: Path) -> int:
+    work_dir = None
+    try:
+        if source.is_dir():
+            report, purges = BulkService.import_directory(source)
+        else:
+            work_dir = blob_store.new_staging_dir("import")
+            root = BulkService.extract_archive(source, work_dir / "tree")
+            report, purges = BulkService.import_directory(root, move=True)
+    except HTTPException as e:
+        print(f"Import failed: {e.detail}", file=sys.stderr)
+        return 1
+    finally:
+        if work_dir is not None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    async def purge():
+        await BulkService.purge(purges)
+        await CloudflareService.stop()
+
+    asyncio.run(purge())
+    db.views.stop()
+    print(json.dumps(report, ensure_ascii=False, indent=1))
+    return 1 if report["failed"] else 0
+
+def export_apps(target: str, compress: bool) -> int:
+    if target == "-":
+        BulkService.write_export(sys.stdout.buffer, compress)
+    else:
+        with open(target, "wb") as f:
+            BulkService.write_export(f, compress or target.endswith((".gz", ".tgz")))
+    return 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="AHost command line tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="deploy and register apps from a tar archive or directory")
+    import_parser.add_argument("source", type=Path, help="tar archive (optionally compressed) or directory holding apps.json or apps/")
+
+    export_parser = commands.add_parser("export", help="write all apps and their current sites as a tar archive")
+    export_parser.add_argument("target", help="output file, or - for stdout")
+    export_parser.add_argument("--gzip", action="store_true", help="compress (implied by a .gz/.tgz target)")
+
+    args = parser.parse_args(argv)
+    if args.command == "import":
+        return import_apps(args.source)
+    return export_apps(args.target, args.gzip)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,14 @@ import os
 from pathlib import Path
 from typing import Any, Dict
 
+# Token buckets per client, by "METHOD /route/{template}"; see RateLimitMiddleware
+DEFAULT_RATE_LIMITS = {
+    "POST /api/upload": {"per_minute": 10, "burst": 5},
+    "POST /api/comment/{slug}": {"per_minute": 10, "burst": 5},
+    "POST /admin/login": {"per_minute": 10, "burst": 5},
+    "POST /admin/api/import": {"per_minute": 2, "burst": 2},
+}
+
 class ConfigManager:
     _instance = None
     _config: Dict[str, Any] = {}
@@ -23,14 +31,51 @@ class ConfigManager:
                 "DB_PATH": "data/db/app.db",
                 "LOG_LEVEL": "INFO"
             }
+            self._mtime = None
             return
 
         with open(config_path, "r") as f:
+            self._mtime = os.fstat(f.fileno()).st_mtime
             self._config = json.load(f)
 
+    def reload_if_changed(self) -> bool:
+        """
+        Re-read config.json if it changed since it was loaded, e.g. written by
+        another worker. Paths and sizes used to build singletons at import time
+        still need a restart; everything read per request picks it up.
+        """
+        try:
+            mtime = Path("config.json").stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        try:
+            self._load_config()
+        except ValueError:
+            # Caught mid-write by a non-atomic editor; the next check retries
+            return False
+        return True
+
     def get(self, key: str, default: Any = None) -> Any:
         return self._config.get(key, default)
 
+    @property
+    def host(self) -> str:
+        return self.get("HOST", "0.0.0.0")
+
+    @property
+    def port(self) -> int:
+        return int(self.get("PORT", 8000))
+
+    @property
+    def workers(self) -> int:
+        return int(self.get("WORKERS", 1))
+
+    @property
+    def broadcast_interval(self) -> float:
+        return float(self.get("BROADCAST_INTERVAL", 1.0))
+
     @property
     def base_url(self) -> str:
         return self.get("BASE_URL", "http://127.0.0.1:8000")
@@ -39,14 +84,233 @@ class ConfigManager:
     def upload_dir(self) -> Path:
         return Path(self.get("UPLOAD_DIR", "data/sites"))
 
+    @property
+    def store_dir(self) -> Path:
+        return Path(self.get("STORE_DIR", "data/store"))
+
+    @property
+    def releases_keep(self) -> int:
+        return int(self.get("RELEASES_KEEP", 3))
+
     @property
     def db_path(self) -> Path:
         return Path(self.get("DB_PATH", "data/db/app.db"))
-    
+
+    @property
+    def db_cache_size_kb(self) -> int:
+        return int(self.get("DB_CACHE_SIZE_KB", 16384))
+
+    @property
+    def db_mmap_size(self) -> int:
+        return int(self.get("DB_MMAP_SIZE", 128 * 1024 * 1024))
+
+    @property
+    def db_statement_cache_size(self) -> int:
+        return int(self.get("DB_STATEMENT_CACHE_SIZE", 256))
+
+    @property
+    def db_read_workers(self) -> int:
+        return int(self.get("DB_READ_WORKERS", 4))
+
+    @property
+    def view_flush_interval(self) -> float:
+        return float(self.get("VIEW_FLUSH_INTERVAL", 5))
+
+    @property
+    def view_flush_threshold(self) -> int:
+        return int(self.get("VIEW_FLUSH_THRESHOLD", 500))
+
+    @property
+    def view_counter_shards(self) -> int:
+        return int(self.get("VIEW_COUNTER_SHARDS", 16))
+
+    @property
+    def page_size(self) -> int:
+        return int(self.get("PAGE_SIZE", 24))
+
+    @property
+    def search_comments(self) -> bool:
+        return bool(self.get("SEARCH_COMMENTS", False))
+
+    @property
+    def search_max_candidates(self) -> int:
+        # Search results, and their pages, stop after this many best matches
+        return int(self.get("SEARCH_MAX_CANDIDATES", 1000))
+
+    @property
+    def comments_page_size(self) -> int:
+        return int(self.get("COMMENTS_PAGE_SIZE", 20))
+
+    @property
+    def admin_page_size(self) -> int:
+        return int(self.get("ADMIN_PAGE_SIZE", 50))
+
+    @property
+    def template_cache_dir(self) -> Path:
+        return Path(self.get("TEMPLATE_CACHE_DIR", "data/cache/jinja"))
+
+    @property
+    def page_cache_ttl(self) -> float:
+        return float(self.get("PAGE_CACHE_TTL", 10))
+
+    @property
+    def page_cache_size(self) -> int:
+        return int(self.get("PAGE_CACHE_SIZE", 1024))
+
+    @property
+    def qr_cache_dir(self) -> Path:
+        return Path(self.get("QR_CACHE_DIR", "data/cache/qr"))
+
+    @property
+    def qr_cache_size(self) -> int:
+        return int(self.get("QR_CACHE_SIZE", 512))
+
+    @property
+    def site_cache_max_bytes(self) -> int:
+        return int(self.get("SITE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+    @property
+    def site_cache_max_file_size(self) -> int:
+        return int(self.get("SITE_CACHE_MAX_FILE_SIZE", 256 * 1024))
+
+    @property
+    def site_index_size(self) -> int:
+        return int(self.get("SITE_INDEX_SIZE", 4096))
+
+    @property
+    def precompress_min_size(self) -> int:
+        return int(self.get("PRECOMPRESS_MIN_SIZE", 1024))
+
+    @property
+    def optimize_assets(self) -> bool:
+        return bool(self.get("OPTIMIZE_ASSETS", False))
+
+    @property
+    def optimize_workers(self) -> int:
+        return int(self.get("OPTIMIZE_WORKERS", 2))
+
+    @property
+    def optimize_jpeg_quality(self) -> int:
+        return int(self.get("OPTIMIZE_JPEG_QUALITY", 85))
+
+    @property
+    def optimize_max_image_dimension(self) -> int:
+        return int(self.get("OPTIMIZE_MAX_IMAGE_DIMENSION", 2048))
+
+    @property
+    def optimize_max_file_size(self) -> int:
+        return int(self.get("OPTIMIZE_MAX_FILE_SIZE", 20 * 1024 * 1024))
+
+    @property
+    def fingerprint_assets(self) -> bool:
+        return bool(self.get("FINGERPRINT_ASSETS", False))
+
+    @property
+    def upload_chunk_size(self) -> int:
+        return int(self.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+    @property
+    def max_upload_size(self) -> int:
+        return int(self.get("MAX_UPLOAD_SIZE", 512 * 1024 * 1024))
+
+    @property
+    def zip_max_uncompressed_size(self) -> int:
+        return int(self.get("ZIP_MAX_UNCOMPRESSED_SIZE", 1024 * 1024 * 1024))
+
+    @property
+    def zip_max_members(self) -> int:
+        return int(self.get("ZIP_MAX_MEMBERS", 20000))
+
+    @property
+    def zip_max_ratio(self) -> int:
+        return int(self.get("ZIP_MAX_RATIO", 100))
+
+    @property
+    def import_workers(self) -> int:
+        return int(self.get("IMPORT_WORKERS", 4))
+
+    @property
+    def import_batch_size(self) -> int:
+        return int(self.get("IMPORT_BATCH_SIZE", 50))
+
+    @property
+    def import_max_size(self) -> int:
+        return int(self.get("IMPORT_MAX_SIZE", 8 * 1024 * 1024 * 1024))
+
+    @property
+    def import_max_members(self) -> int:
+        return int(self.get("IMPORT_MAX_MEMBERS", 1000000))
+
     @property
     def log_level(self) -> str:
         return self.get("LOG_LEVEL", "INFO")
 
+    @property
+    def log_path(self) -> str:
+        return self.get("LOG_PATH", "logs/app.log")
+
+    @property
+    def access_log(self) -> bool:
+        return bool(self.get("ACCESS_LOG", False))
+
+    @property
+    def access_log_path(self) -> str:
+        return self.get("ACCESS_LOG_PATH", "logs/access.log")
+
+    @property
+    def access_log_sample_rate(self) -> float:
+        return float(self.get("ACCESS_LOG_SAMPLE_RATE", 1.0))
+
+    @property
+    def access_log_sampling(self) -> Dict[str, float]:
+        return self.get("ACCESS_LOG_SAMPLING", {})
+
+    @property
+    def rate_limit(self) -> bool:
+        return bool(self.get("RATE_LIMIT", True))
+
+    @property
+    def rate_limits(self) -> Dict[str, Dict[str, float]]:
+        return self.get("RATE_LIMITS", DEFAULT_RATE_LIMITS)
+
+    @property
+    def rate_limit_ip_header(self) -> str:
+        # e.g. "CF-Connecting-IP" or "X-Forwarded-For" behind a proxy; empty uses the peer address
+        return self.get("RATE_LIMIT_IP_HEADER", "")
+
+    @property
+    def rate_limit_proxy_hops(self) -> int:
+        # Proxies of ours that append to X-Forwarded-For; the client is that many entries from the right
+        return max(1, int(self.get("RATE_LIMIT_PROXY_HOPS", 1)))
+
+    @property
+    def rate_limit_max_clients(self) -> int:
+        return int(self.get("RATE_LIMIT_MAX_CLIENTS", 100000))
+
+    @property
+    def max_concurrent_uploads(self) -> int:
+        return int(self.get("MAX_CONCURRENT_UPLOADS", 2))
+
+    @property
+    def busy_retry_after(self) -> int:
+        return int(self.get("BUSY_RETRY_AFTER", 5))
+
+    @property
+    def analytics(self) -> bool:
+        return bool(self.get("ANALYTICS", True))
+
+    @property
+    def analytics_flush_interval(self) -> float:
+        return float(self.get("ANALYTICS_FLUSH_INTERVAL", 60))
+
+    @property
+    def analytics_recent_minutes(self) -> int:
+        return int(self.get("ANALYTICS_RECENT_MINUTES", 120))
+
+    @property
+    def analytics_hourly_retention_days(self) -> int:
+        return int(self.get("ANALYTICS_HOURLY_RETENTION_DAYS", 30))
+
     @property
     def upload_password(self) -> str:
         return self.get("UPLOAD_PASSWORD", "admin")
@@ -59,6 +323,22 @@ class ConfigManager:
     def cf_api_token(self) -> str:
         return self.get("CF_API_TOKEN", "")
 
+    @property
+    def cf_api_base(self) -> str:
+        return self.get("CF_API_BASE", "https://api.cloudflare.com/client/v4").rstrip("/")
+
+    @property
+    def cf_purge_delay(self) -> float:
+        return float(self.get("CF_PURGE_DELAY", 1.0))
+
+    @property
+    def cf_purge_retries(self) -> int:
+        return int(self.get("CF_PURGE_RETRIES", 5))
+
+    @property
+    def cf_purge_backoff(self) -> float:
+        return float(self.get("CF_PURGE_BACKOFF", 1.0))
+
     @property
     def domain_name(self) -> str:
         return self.get("DOMAIN_NAME", "a.104800.xyz")
@@ -67,10 +347,18 @@ class ConfigManager:
     def iflow_api_key(self) -> str:
         return self.get("IFLOW_API_KEY", "")
 
+    @property
+    def metrics_token(self) -> str:
+        return self.get("METRICS_TOKEN", "")
+
     def update_iflow_key(self, key: str):
         self._config["IFLOW_API_KEY"] = key
         config_path = Path("config.json")
-        with open(config_path, "w") as f:
+        # Other workers reload on the mtime change, so never let them see a partial file
+        tmp_path = config_path.with_name(f".config.json.{os.getpid()}")
+        with open(tmp_path, "w") as f:
             json.dump(self._config, f, indent=4)
+        os.replace(tmp_path, config_path)
+        self._mtime = config_path.stat().st_mtime
 
 config = ConfigManager()
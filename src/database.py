@@ -1,152 +1,783 @@
+import asyncio
+import base64
+import functools
+import json
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from src.config import config
+from src.utils.hll import HyperLogLog
 from src.utils.logger import logger
+from src.utils.metrics import DB_LATENCY, timed
+
+class ViewCounter:
+    """
+    Write-behind buffer for apps.view_count.
+
+    Increments are coalesced in memory across a few lock-striped shards and
+    written in one batched transaction by a background thread, either every
+    VIEW_FLUSH_INTERVAL seconds or once VIEW_FLUSH_THRESHOLD hits are pending.
+    """
+
+    def __init__(self, database: "Database"):
+        self._db = database
+        self._shards = [({}, threading.Lock()) for _ in range(config.view_counter_shards)]
+        # Hits pending per shard, each only changed under its shard's lock
+        self._pending_hits = [0] * len(self._shards)
+        # Deltas taken out of the shards but not yet committed, so readers
+        # never miss views that are in the middle of a flush.
+        self._inflight: Dict[str, int] = {}
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def _shard(self, slug: str):
+        return self._shards[hash(slug) % len(self._shards)]
+
+    def increment(self, slug: str, amount: int = 1):
+        index = hash(slug) % len(self._shards)
+        counts, lock = self._shards[index]
+        with lock:
+            counts[slug] = counts.get(slug, 0) + amount
+            self._pending_hits[index] += amount
+        if self._thread is None:
+            self.start()
+        if sum(self._pending_hits) >= config.view_flush_threshold:
+            self._wakeup.set()
+
+    def pending(self, slug: str) -> int:
+        counts, lock = self._shard(slug)
+        with lock:
+            delta = counts.get(slug, 0)
+        return delta + self._inflight.get(slug, 0)
+
+    def apply(self, app: Dict[str, Any]) -> Dict[str, Any]:
+        """Add not-yet-flushed views to an app row read from the database."""
+        delta = self.pending(app["slug"])
+        if delta:
+            app["view_count"] = (app["view_count"] or 0) + delta
+        return app
+
+    @timed(DB_LATENCY)
+    def flush(self):
+        with self._flush_lock:
+            batch: Dict[str, int] = {}
+            for index, (counts, lock) in enumerate(self._shards):
+                with lock:
+                    for slug, delta in counts.items():
+                        batch[slug] = batch.get(slug, 0) + delta
+                    counts.clear()
+                    self._pending_hits[index] = 0
+            if not batch:
+                return
+            self._inflight = batch
+            try:
+                conn = self._db._get_connection()
+                with conn:
+                    conn.executemany(
+                        "UPDATE apps SET view_count = view_count + ? WHERE slug = ?",
+                        [(delta, slug) for slug, delta in batch.items()]
+                    )
+            except sqlite3.Error as e:
+                logger.error(f"Failed to flush {len(batch)} view counts: {e}")
+                self._inflight = {}
+                for slug, delta in batch.items():
+                    self.increment(slug, delta)
+            finally:
+                self._inflight = {}
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="view-counter-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(config.view_flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+def _columns(cursor: sqlite3.Cursor, table: str) -> List[str]:
+    return [info[1] for info in cursor.execute(f"PRAGMA table_info({table})").fetchall()]
+
+def _create_fts(cursor: sqlite3.Cursor, table: str, columns: str, content: str):
+    """Create an external-content FTS5 table over `content`, filling it if it is new."""
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    if exists:
+        return
+    try:
+        # Trigrams give substring matches, which also works for CJK text
+        # that unicode61 would treat as one long token
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {table} USING fts5({columns}, content='{content}', "
+            f"content_rowid='id', tokenize='trigram')"
+        )
+    except sqlite3.OperationalError:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {table} USING fts5({columns}, content='{content}', content_rowid='id')"
+        )
+    cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+# Schema migrations, applied in order; PRAGMA user_version counts how many a
+# database has had, so each runs once. Databases from before user_version was
+# kept start at 0 in any of the older shapes, which is why the early steps
+# check before they change anything.
+
+def _migrate_base_tables(cursor: sqlite3.Cursor):
+    """apps and comments tables"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS apps (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            slug TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            view_count INTEGER DEFAULT 0,
+            author TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS comments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            app_slug TEXT NOT NULL,
+            content TEXT NOT NULL,
+            author TEXT DEFAULT 'Anonymous',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(app_slug) REFERENCES apps(slug)
+        )
+    """)
+
+def _migrate_app_author(cursor: sqlite3.Cursor):
+    """apps.author"""
+    if "author" not in _columns(cursor, "apps"):
+        cursor.execute("ALTER TABLE apps ADD COLUMN author TEXT")
+
+def _migrate_comment_count(cursor: sqlite3.Cursor):
+    """apps.comment_count"""
+    if "comment_count" not in _columns(cursor, "apps"):
+        cursor.execute("ALTER TABLE apps ADD COLUMN comment_count INTEGER DEFAULT 0")
+        cursor.execute("""
+            UPDATE apps SET comment_count = (
+                SELECT COUNT(*) FROM comments WHERE comments.app_slug = apps.slug
+            )
+        """)
+
+def _migrate_events(cursor: sqlite3.Cursor):
+    """events table"""
+    # Change feed polled by every worker process (see services/broadcast.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL DEFAULT '',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def _migrate_listing_indexes(cursor: sqlite3.Cursor):
+    """keyset pagination and lookup indexes"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_apps_created ON apps (created_at, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_apps_views ON apps (view_count, created_at, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comments_app ON comments (app_slug, created_at, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_apps_name ON apps (name)")
+
+def _migrate_app_search(cursor: sqlite3.Cursor):
+    """apps_fts full-text index"""
+    _create_fts(cursor, "apps_fts", "name, description, author", "apps")
+    # bm25 is lower for better matches; weight name over author over description
+    cursor.execute("INSERT INTO apps_fts (apps_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0, 5.0)')")
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS apps_fts_insert AFTER INSERT ON apps BEGIN
+            INSERT INTO apps_fts (rowid, name, description, author)
+            VALUES (new.id, new.name, new.description, new.author);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS apps_fts_delete AFTER DELETE ON apps BEGIN
+            INSERT INTO apps_fts (apps_fts, rowid, name, description, author)
+            VALUES ('delete', old.id, old.name, old.description, old.author);
+        END
+    """)
+    # Only the indexed columns: view and comment counters change far more often
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS apps_fts_update AFTER UPDATE OF name, description, author ON apps BEGIN
+            INSERT INTO apps_fts (apps_fts, rowid, name, description, author)
+            VALUES ('delete', old.id, old.name, old.description, old.author);
+            INSERT INTO apps_fts (rowid, name, description, author)
+            VALUES (new.id, new.name, new.description, new.author);
+        END
+    """)
+
+def _migrate_view_stats(cursor: sqlite3.Cursor):
+    """hourly and daily view rollups"""
+    # sketch is a HyperLogLog of the period's visitors (see utils/hll.py)
+    for table, bucket in (("view_stats_hourly", "hour"), ("view_stats_daily", "day")):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                slug TEXT NOT NULL,
+                {bucket} TEXT NOT NULL,
+                views INTEGER NOT NULL DEFAULT 0,
+                sketch BLOB,
+                PRIMARY KEY (slug, {bucket})
+            ) WITHOUT ROWID
+        """)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{bucket} ON {table} ({bucket})")
+
+# Append only: never reorder or edit a migration that has shipped
+MIGRATIONS: List[Callable[[sqlite3.Cursor], None]] = [
+    _migrate_base_tables,
+    _migrate_app_author,
+    _migrate_comment_count,
+    _migrate_events,
+    _migrate_listing_indexes,
+    _migrate_app_search,
+    _migrate_view_stats,
+]
+
+# Rollup granularity -> (table, bucket column)
+VIEW_STATS_TABLES = {"hour": ("view_stats_hourly", "hour"), "day": ("view_stats_daily", "day")}
+
+def _sync_comment_search(cursor: sqlite3.Cursor):
+    """Create or drop the comment index to match SEARCH_COMMENTS, a setting rather than a migration."""
+    if config.search_comments:
+        _create_fts(cursor, "comments_fts", "content", "comments")
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments BEGIN
+                INSERT INTO comments_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS comments_fts_delete AFTER DELETE ON comments BEGIN
+                INSERT INTO comments_fts (comments_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END
+        """)
+    else:
+        # Don't pay for keeping an index nobody queries in sync
+        cursor.execute("DROP TRIGGER IF EXISTS comments_fts_insert")
+        cursor.execute("DROP TRIGGER IF EXISTS comments_fts_delete")
+        cursor.execute("DROP TABLE IF EXISTS comments_fts")
 
 class Database:
+    # Keyset columns and direction for each listing order. Each tuple is
+    # covered by an index created in _init_db, so a page is an index range scan.
+    SORT_KEYS = {
+        "views": (("view_count", "created_at", "id"), "DESC"),
+        "created_asc": (("created_at", "id"), "ASC"),
+        "created_desc": (("created_at", "id"), "DESC"),
+    }
+    # Rows of the events table kept for workers that fall behind
+    EVENTS_KEEP = 10000
+
     def __init__(self):
         self.db_path = config.db_path
+        # One connection per thread: sqlite3 connections are cheap to reuse but
+        # not safe to share, and each keeps its own prepared statement cache.
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.views = ViewCounter(self)
+        # Called with the slugs after every committed write to apps or comments
+        self._listeners: List[Callable[[List[str]], None]] = []
         self._init_db()
 
-    def _get_connection(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=config.db_statement_cache_size,
+        )
         conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{config.db_cache_size_kb}")
+        conn.execute(f"PRAGMA mmap_size={config.db_mmap_size}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA busy_timeout=5000")
         return conn
 
+    def _get_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to close database connection: {e}")
+        self._local = threading.local()
+
+    def release(self):
+        """Close the calling thread's connection; for short-lived threads, before they exit."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
     def _init_db(self):
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         conn = self._get_connection()
-        cursor = conn.cursor()
-        # Create table if not exists
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS apps (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                slug TEXT UNIQUE NOT NULL,
-                name TEXT NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                view_count INTEGER DEFAULT 0,
-                author TEXT
-            )
-        """)
+        # The common case, a restart against a migrated database, only reads
+        if not self._schema_current(conn):
+            with conn:
+                # Workers start together; take the write lock up front so only
+                # one of them migrates, then re-check under it
+                conn.execute("BEGIN IMMEDIATE")
+                cursor = conn.cursor()
+                version = cursor.execute("PRAGMA user_version").fetchone()[0]
+                for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                    migration(cursor)
+                    logger.info("Applied database migration {}: {}", number, migration.__doc__)
+                if version < len(MIGRATIONS):
+                    cursor.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+                _sync_comment_search(cursor)
+            self._schema_current(conn)
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS comments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                app_slug TEXT NOT NULL,
-                content TEXT NOT NULL,
-                author TEXT DEFAULT 'Anonymous',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(app_slug) REFERENCES apps(slug)
-            )
-        """)
-        
-        # Check if author column exists (for migration)
-        cursor.execute("PRAGMA table_info(apps)")
-        columns = [info[1] for info in cursor.fetchall()]
-        if "author" not in columns:
-            cursor.execute("ALTER TABLE apps ADD COLUMN author TEXT")
-            
-        conn.commit()
-        conn.close()
         logger.info("Database initialized")
 
+    def _schema_current(self, conn: sqlite3.Connection) -> bool:
+        """Whether every migration has run and comment search matches SEARCH_COMMENTS."""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        tables = dict(conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name IN ('apps_fts', 'comments_fts')"
+        ).fetchall())
+        sql = tables.get("apps_fts") or ""
+        self.fts_min_term = 3 if "trigram" in sql else 1
+        return version >= len(MIGRATIONS) and ("comments_fts" in tables) == config.search_comments
+
+    def add_listener(self, callback: Callable[[List[str]], None]):
+        self._listeners.append(callback)
+
+    def _notify(self, *slugs: str):
+        for callback in self._listeners:
+            try:
+                callback(list(slugs))
+            except Exception as e:
+                logger.error(f"Change listener failed for {', '.join(slugs)}: {e}")
+
+    @timed(DB_LATENCY)
     def create_app(self, slug: str, name: str, description: str, author: str = None) -> int:
         conn = self._get_connection()
         try:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO apps (slug, name, description, author, created_at) VALUES (?, ?, ?, ?, ?)",
-                (slug, name, description, author, datetime.now())
-            )
-            conn.commit()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO apps (slug, name, description, author, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (slug, name, description, author, datetime.now())
+                )
+            self._notify(slug)
             return cursor.lastrowid
         except sqlite3.IntegrityError:
             logger.error(f"App with slug {slug} already exists")
             raise ValueError(f"App with slug {slug} already exists")
-        finally:
-            conn.close()
 
+    @timed(DB_LATENCY)
     def update_app(self, slug: str, name: str, description: str, author: str = None):
         conn = self._get_connection()
-        try:
-            cursor = conn.cursor()
-            cursor.execute(
+        with conn:
+            conn.execute(
                 "UPDATE apps SET name = ?, description = ?, author = ? WHERE slug = ?",
                 (name, description, author, slug)
             )
-            conn.commit()
-        finally:
-            conn.close()
+        self._notify(slug)
 
+    @timed(DB_LATENCY)
     def get_app(self, slug: str) -> Optional[Dict[str, Any]]:
         conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM apps WHERE slug = ?", (slug,))
-        row = cursor.fetchone()
-        conn.close()
+        row = conn.execute("SELECT * FROM apps WHERE slug = ?", (slug,)).fetchone()
         if row:
-            return dict(row)
+            return self.views.apply(dict(row))
         return None
 
+    @timed(DB_LATENCY)
     def get_app_by_name(self, name: str) -> Optional[Dict[str, Any]]:
         conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM apps WHERE name = ?", (name,))
-        row = cursor.fetchone()
-        conn.close()
+        row = conn.execute("SELECT * FROM apps WHERE name = ?", (name,)).fetchone()
         if row:
-            return dict(row)
+            return self.views.apply(dict(row))
         return None
 
     def increment_view_count(self, slug: str):
+        # Buffered; see ViewCounter
+        self.views.increment(slug)
+
+    @staticmethod
+    def encode_cursor(key: List[Any], offset: int) -> str:
+        raw = json.dumps({"k": key, "n": offset}, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Dict[str, Any]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            data = json.loads(raw)
+            if not isinstance(data["k"], list) or not isinstance(data["n"], int):
+                raise TypeError
+            return data
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("Invalid cursor")
+
+    @timed(DB_LATENCY)
+    def count_apps(self) -> int:
         conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE apps SET view_count = view_count + 1 WHERE slug = ?", (slug,))
-        conn.commit()
-        conn.close()
+        return conn.execute("SELECT COUNT(*) FROM apps").fetchone()[0]
 
-    def list_apps(self, sort_by: str = "views") -> List[Dict[str, Any]]:
+    def list_apps(self, sort_by: str = "views", limit: Optional[int] = None,
+                  after: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+        return [self.views.apply(row) for row in self._list_rows(sort_by, limit, after)]
+
+    @timed(DB_LATENCY)
+    def _list_rows(self, sort_by: str, limit: Optional[int], after: Optional[List[Any]]) -> List[Dict[str, Any]]:
+        # Sorting by views uses the stored counts, so it lags the displayed
+        # ones by at most VIEW_FLUSH_INTERVAL; flushing here would put a
+        # write transaction on every listing.
         conn = self._get_connection()
-        cursor = conn.cursor()
-        
-        if sort_by == "views":
-            order_by = "view_count DESC, created_at DESC"
-        elif sort_by == "created_asc":
-            order_by = "created_at ASC"
-        else:
-            order_by = "created_at DESC"
-            
-        cursor.execute(f"SELECT * FROM apps ORDER BY {order_by}")
-        rows = cursor.fetchall()
-        conn.close()
+        columns, direction = self.SORT_KEYS.get(sort_by, self.SORT_KEYS["created_desc"])
+
+        query = "SELECT * FROM apps"
+        params: List[Any] = []
+        if after is not None:
+            if len(after) != len(columns):
+                raise ValueError("Invalid cursor")
+            op = "<" if direction == "DESC" else ">"
+            query += f" WHERE ({', '.join(columns)}) {op} ({', '.join('?' * len(columns))})"
+            params.extend(after)
+        query += " ORDER BY " + ", ".join(f"{column} {direction}" for column in columns)
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        rows = conn.execute(query, params).fetchall()
         return [dict(row) for row in rows]
 
+    def list_apps_page(self, sort_by: str = "created_desc", limit: int = 24,
+                       cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        One page of apps in keyset order. Returns the rows, the number of rows
+        before this page and an opaque cursor for the next page (None at the end).
+        """
+        after, offset = None, 0
+        if cursor:
+            data = self.decode_cursor(cursor)
+            after, offset = data["k"], data["n"]
+
+        items = self._list_rows(sort_by, limit + 1, after)
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            columns, _ = self.SORT_KEYS.get(sort_by, self.SORT_KEYS["created_desc"])
+            # The cursor holds the stored keys, before pending views are added
+            last = items[-1]
+            next_cursor = self.encode_cursor([last[column] for column in columns], offset + limit)
+        return {"items": [self.views.apply(item) for item in items], "offset": offset, "next_cursor": next_cursor}
+
+    @timed(DB_LATENCY)
+    def search_apps(self, query: str, limit: Optional[int] = None,
+                    after: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Apps matching every term of query, best match first. Terms too short
+        for the FTS tokenizer are applied as substring filters instead.
+        """
+        terms = query.split()
+        if not terms:
+            raise ValueError("Empty search query")
+        long_terms = [t for t in terms if len(t) >= self.fts_min_term]
+        short_terms = [t for t in terms if len(t) < self.fts_min_term]
+
+        params: List[Any] = []
+        if long_terms:
+            match = " ".join('"' + t.replace('"', '""') + '"' for t in long_terms)
+            # The hidden rank column uses the bm25 weights set in _migrate_app_search;
+            # bm25() itself cannot be called from inside a subquery. Every
+            # match is scored, and FTS5 keeps only the best SEARCH_MAX_CANDIDATES
+            # of them for the join and the pagination below.
+            hits = "SELECT * FROM (SELECT rowid AS app_id, rank FROM apps_fts WHERE apps_fts MATCH ? ORDER BY rank LIMIT ?)"
+            params.extend([match, config.search_max_candidates])
+            if config.search_comments:
+                hits += """
+                    UNION ALL
+                    SELECT apps.id, c.rank * 0.5 FROM (
+                        SELECT rowid, rank FROM comments_fts WHERE comments_fts MATCH ?
+                        ORDER BY rank LIMIT ?
+                    ) AS c
+                    JOIN comments ON comments.id = c.rowid
+                    JOIN apps ON apps.slug = comments.app_slug
+                """
+                params.extend([match, config.search_max_candidates])
+            source = f"""
+                SELECT apps.*, hits.rank AS rank FROM (
+                    SELECT app_id, MIN(rank) AS rank FROM ({hits}) GROUP BY app_id
+                ) AS hits JOIN apps ON apps.id = hits.app_id
+            """
+        else:
+            source = "SELECT apps.*, 0.0 AS rank FROM apps"
+
+        sql = f"SELECT * FROM ({source}) AS r WHERE 1"
+        for term in short_terms:
+            pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            sql += " AND (r.name LIKE ? ESCAPE '\\' OR r.description LIKE ? ESCAPE '\\' OR r.author LIKE ? ESCAPE '\\')"
+            params.extend([pattern] * 3)
+        if after is not None:
+            if len(after) != 2:
+                raise ValueError("Invalid cursor")
+            sql += " AND (r.rank > ? OR (r.rank = ? AND r.id < ?))"
+            params.extend([after[0], after[0], after[1]])
+        sql += " ORDER BY r.rank, r.id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        conn = self._get_connection()
+        rows = conn.execute(sql, params).fetchall()
+        return [self.views.apply(dict(row)) for row in rows]
+
+    def search_apps_page(self, query: str, limit: int = 24, cursor: Optional[str] = None) -> Dict[str, Any]:
+        after, offset = None, 0
+        if cursor:
+            data = self.decode_cursor(cursor)
+            after, offset = data["k"], data["n"]
+
+        items = self.search_apps(query, limit=limit + 1, after=after)
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_cursor = self.encode_cursor([last["rank"], last["id"]], offset + limit)
+        return {"items": items, "offset": offset, "next_cursor": next_cursor}
+
+    @timed(DB_LATENCY)
     def add_comment(self, slug: str, content: str, author: str = "Anonymous"):
         conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO comments (app_slug, content, author, created_at) VALUES (?, ?, ?, ?)",
-            (slug, content, author, datetime.now())
-        )
-        conn.commit()
-        conn.close()
+        with conn:
+            conn.execute(
+                "INSERT INTO comments (app_slug, content, author, created_at) VALUES (?, ?, ?, ?)",
+                (slug, content, author, datetime.now())
+            )
+            conn.execute("UPDATE apps SET comment_count = comment_count + 1 WHERE slug = ?", (slug,))
+        self._notify(slug)
 
-    def get_comments(self, slug: str) -> List[Dict[str, Any]]:
+    @timed(DB_LATENCY)
+    def get_comments(self, slug: str, limit: Optional[int] = None,
+                     after: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
         conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM comments WHERE app_slug = ? ORDER BY created_at DESC", (slug,))
-        rows = cursor.fetchall()
-        conn.close()
+        query = "SELECT * FROM comments WHERE app_slug = ?"
+        params: List[Any] = [slug]
+        if after is not None:
+            if len(after) != 2:
+                raise ValueError("Invalid cursor")
+            query += " AND (created_at, id) < (?, ?)"
+            params.extend(after)
+        query += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = conn.execute(query, params).fetchall()
         return [dict(row) for row in rows]
 
+    def get_comments_page(self, slug: str, limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+        after, offset = None, 0
+        if cursor:
+            data = self.decode_cursor(cursor)
+            after, offset = data["k"], data["n"]
+
+        items = self.get_comments(slug, limit=limit + 1, after=after)
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_cursor = self.encode_cursor([last["created_at"], last["id"]], offset + limit)
+        return {"items": items, "offset": offset, "next_cursor": next_cursor}
+
+    @timed(DB_LATENCY)
     def delete_app(self, slug: str):
         conn = self._get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM apps WHERE slug = ?", (slug,))
-        cursor.execute("DELETE FROM comments WHERE app_slug = ?", (slug,))
-        conn.commit()
-        conn.close()
+        with conn:
+            conn.execute("DELETE FROM apps WHERE slug = ?", (slug,))
+            conn.execute("DELETE FROM comments WHERE app_slug = ?", (slug,))
+            conn.execute("DELETE FROM view_stats_hourly WHERE slug = ?", (slug,))
+            conn.execute("DELETE FROM view_stats_daily WHERE slug = ?", (slug,))
+        self._notify(slug)
+
+    @timed(DB_LATENCY)
+    def import_apps(self, apps: List[Dict[str, Any]]) -> int:
+        """
+        Register a batch of apps in one transaction. New slugs keep their
+        exported created_at, view count and comments; existing ones only get
+        their name, description and author updated. Returns how many were new.
+        """
+        conn = self._get_connection()
+        created = 0
+        with conn:
+            for app in apps:
+                cursor = conn.execute(
+                    "INSERT INTO apps (slug, name, description, author, created_at, view_count) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(slug) DO NOTHING",
+                    (app["slug"], app["name"], app.get("description"), app.get("author"),
+                     app.get("created_at") or datetime.now(), app.get("view_count") or 0)
+                )
+                if cursor.rowcount == 0:
+                    conn.execute(
+                        "UPDATE apps SET name = ?, description = ?, author = ? WHERE slug = ?",
+                        (app["name"], app.get("description"), app.get("author"), app["slug"])
+                    )
+                    continue
+                created += 1
+                comments = app.get("comments") or []
+                conn.executemany(
+                    "INSERT INTO comments (app_slug, content, author, created_at) VALUES (?, ?, ?, ?)",
+                    [(app["slug"], comment["content"], comment.get("author") or "Anonymous",
+                      comment.get("created_at") or datetime.now()) for comment in comments]
+                )
+                conn.execute("UPDATE apps SET comment_count = ? WHERE slug = ?", (len(comments), app["slug"]))
+        self._notify(*(app["slug"] for app in apps))
+        return created
+
+    @timed(DB_LATENCY)
+    def add_view_stats(self, rollups: Dict[str, Dict[Tuple[str, str], Tuple[int, bytes]]],
+                       prune_hours_before: Optional[str] = None):
+        """
+        Add granularity -> {(slug, bucket): (views, visitor sketch)} to the
+        rollup tables in one transaction, merging each sketch into the one
+        already stored. Hourly buckets older than prune_hours_before are dropped.
+        """
+        conn = self._get_connection()
+        with conn:
+            # Read-merge-write of the sketches must not interleave with another worker's
+            conn.execute("BEGIN IMMEDIATE")
+            for granularity, rows in rollups.items():
+                table, bucket = VIEW_STATS_TABLES[granularity]
+                for (slug, key), (views, sketch) in rows.items():
+                    stored = conn.execute(
+                        f"SELECT sketch FROM {table} WHERE slug = ? AND {bucket} = ?", (slug, key)
+                    ).fetchone()
+                    if stored and stored[0]:
+                        sketch = HyperLogLog.union((stored[0], sketch)).to_bytes()
+                    conn.execute(
+                        f"INSERT INTO {table} (slug, {bucket}, views, sketch) VALUES (?, ?, ?, ?) "
+                        f"ON CONFLICT(slug, {bucket}) DO UPDATE SET views = views + excluded.views, "
+                        f"sketch = excluded.sketch",
+                        (slug, key, views, sketch)
+                    )
+            if prune_hours_before is not None:
+                conn.execute("DELETE FROM view_stats_hourly WHERE hour < ?", (prune_hours_before,))
+
+    @timed(DB_LATENCY)
+    def get_view_stats(self, granularity: str, since: str, slug: Optional[str] = None,
+                       slugs: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Rollup rows from bucket `since` on, oldest first, for one slug, a list of them or all."""
+        table, bucket = VIEW_STATS_TABLES[granularity]
+        conn = self._get_connection()
+        query = f"SELECT slug, {bucket} AS bucket, views, sketch FROM {table} WHERE {bucket} >= ?"
+        params: List[Any] = [since]
+        if slug is not None:
+            query += " AND slug = ?"
+            params.append(slug)
+        if slugs is not None:
+            query += f" AND slug IN ({', '.join('?' * len(slugs))})"
+            params.extend(slugs)
+        rows = conn.execute(query + f" ORDER BY {bucket}", params).fetchall()
+        return [dict(row) for row in rows]
+
+    @timed(DB_LATENCY)
+    def top_view_stats(self, since: str, limit: int) -> List[Dict[str, Any]]:
+        """Slugs with the most views in the daily rollups from day `since` on."""
+        conn = self._get_connection()
+        rows = conn.execute(
+            "SELECT slug, SUM(views) AS views FROM view_stats_daily WHERE day >= ? "
+            "GROUP BY slug ORDER BY views DESC LIMIT ?",
+            (since, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    @timed(DB_LATENCY)
+    def publish_events(self, origin: int, events: List[Tuple[str, str]]):
+        """Append (kind, key) events in one transaction."""
+        conn = self._get_connection()
+        with conn:
+            conn.executemany("INSERT INTO events (origin, kind, key) VALUES (?, ?, ?)",
+                             [(origin, kind, key) for kind, key in events])
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            # Pollers only ever need the tail, so trim the table now and then
+            if last_id // 1000 != (last_id - len(events)) // 1000:
+                conn.execute("DELETE FROM events WHERE id <= ?", (last_id - self.EVENTS_KEEP,))
+
+    @timed(DB_LATENCY)
+    def last_event_id(self) -> int:
+        conn = self._get_connection()
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+    @timed(DB_LATENCY)
+    def get_events(self, after_id: int, exclude_origin: int) -> List[Dict[str, Any]]:
+        conn = self._get_connection()
+        rows = conn.execute(
+            "SELECT id, kind, key FROM events WHERE id > ? AND origin != ? ORDER BY id",
+            (after_id, exclude_origin)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+class AsyncDatabase:
+    """
+    Awaitable facade over Database for async route handlers.
+
+    Writes are serialized on one dedicated thread, since SQLite only has a
+    single writer anyway. Reads run on a small pool whose threads each keep
+    their own WAL connection, so they never queue behind a slow write and the
+    event loop never blocks on SQLite.
+    """
+
+    WRITE_METHODS = frozenset({"create_app", "update_app", "delete_app", "add_comment", "import_apps",
+                               "add_view_stats", "publish_events"})
+
+    def __init__(self, database: Database):
+        self._db = database
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=config.db_read_workers, thread_name_prefix="db-reader")
+
+    def __getattr__(self, name: str):
+        method = getattr(self._db, name)
+        executor = self._writer if name in self.WRITE_METHODS else self._readers
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, functools.partial(method, *args, **kwargs))
+
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, call)
+        return call
+
+    def shutdown(self):
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
 
 db = Database()
+async_db = AsyncDatabase(db)
@@ -1,32 +1,83 @@
-from fastapi import APIRouter, Request, UploadFile, File, Form, HTTPException, Depends
+from fastapi import APIRouter, Request, UploadFile, File, Form, HTTPException, Depends, Query
 from fastapi.responses import RedirectResponse, HTMLResponse
-from fastapi.templating import Jinja2Templates
 import random
 import string
-from src.database import db
+from src.database import async_db
 from src.services.file_service import FileService
+from src.services.page_cache import page_cache, LISTING
+from src.config import config
+from src.utils.templates import templates
 from src.utils.logger import logger
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 def generate_slug(length=6):
     return ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
 
 @router.get("/", response_class=HTMLResponse)
 async def index(request: Request):
-    apps = db.list_apps(sort_by="created_desc")
-    return templates.TemplateResponse("index.html", {"request": request, "apps": apps})
+    html = page_cache.get(LISTING, "index")
+    if html is None:
+        generation = page_cache.generation(LISTING)
+        # Only the first page is rendered; the rest is fetched from /api/apps on scroll
+        page = await async_db.list_apps_page(sort_by="created_desc", limit=config.page_size)
+        html = templates.get_template("index.html").render({
+            "request": request,
+            "apps": page["items"],
+            "total": await async_db.count_apps(),
+            "offset": page["offset"],
+            "next_cursor": page["next_cursor"]
+        })
+        page_cache.put(LISTING, "index", html, generation)
+    return HTMLResponse(html)
+
+@router.get("/api/apps")
+async def list_apps(
+    sort: str = "created_desc",
+    cursor: str = None,
+    limit: int = Query(None, ge=1, le=100),
+    html: bool = False
+):
+    try:
+        page = await async_db.list_apps_page(sort_by=sort, limit=limit or config.page_size, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = {"items": page["items"], "next_cursor": page["next_cursor"]}
+    if html:
+        # Pre-rendered cards for the home page's infinite scroll
+        result["html"] = templates.get_template("partials/app_cards.html").render(
+            apps=page["items"], total=await async_db.count_apps(), offset=page["offset"]
+        )
+    return result
+
+@router.get("/api/search")
+async def search_apps(
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: str = None,
+    limit: int = Query(None, ge=1, le=100),
+    html: bool = False
+):
+    try:
+        page = await async_db.search_apps_page(q, limit=limit or config.page_size, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = {"items": page["items"], "next_cursor": page["next_cursor"]}
+    if html:
+        # Search results have no stable position in the catalogue, so no NO. badge
+        result["html"] = templates.get_template("partials/app_cards.html").render(
+            apps=page["items"], total=None, offset=page["offset"]
+        )
+    return result
 
 @router.get("/upload", response_class=HTMLResponse)
 async def upload_page(request: Request):
     return templates.TemplateResponse("upload.html", {"request": request})
 
-from src.config import config
-
 @router.get("/api/check_app")
 async def check_app(name: str):
-    app = db.get_app_by_name(name)
+    app = await async_db.get_app_by_name(name)
     if app:
         return {
             "found": True,
@@ -58,7 +109,7 @@ async def upload_app(
         slug = generate_slug()
     
     # Check if slug exists
-    existing_app = db.get_app(slug)
+    existing_app = await async_db.get_app(slug)
 
     try:
         # Save file (will backup if exists)
@@ -66,12 +117,17 @@ async def upload_app(
         
         if existing_app:
             # Update existing app
-            db.update_app(slug=slug, name=name, description=description, author=author)
-            logger.info(f"Updated app: {slug}")
+            await async_db.update_app(slug=slug, name=name, description=description, author=author)
+            logger.info("Updated app: {}", slug)
         else:
             # Create new app
-            db.create_app(slug=slug, name=name, description=description, author=author)
-            logger.info(f"Created new app: {slug}")
+            try:
+                await async_db.create_app(slug=slug, name=name, description=description, author=author)
+                logger.info("Created new app: {}", slug)
+            except ValueError:
+                # A concurrent upload to the same new slug created it first
+                await async_db.update_app(slug=slug, name=name, description=description, author=author)
+                logger.info("Updated app: {}", slug)
         
         return RedirectResponse(url=f"/i/{slug}", status_code=303)
     except HTTPException:
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Request, Form, HTTPException, Response
-from fastapi.responses import RedirectResponse, HTMLResponse
-from fastapi.templating import Jinja2Templates
-from src.database import db
+import asyncio
+from datetime import datetime
+from fastapi import APIRouter, Request, Form, File, HTTPException, Response, UploadFile
+from fastapi.responses import RedirectResponse, HTMLResponse, StreamingResponse
+from src.database import async_db
 from src.config import config
+from src.utils.templates import templates
 from src.utils.logger import logger
 
 router = APIRouter(prefix="/admin")
-templates = Jinja2Templates(directory="templates")
 
 @router.get("/", response_class=HTMLResponse)
 @router.get("", response_class=HTMLResponse)
@@ -22,13 +23,20 @@ async def login(password: str = Form(...)):
     return RedirectResponse(url="/admin?error=Invalid password", status_code=303)
 
 @router.get("/dashboard", response_class=HTMLResponse)
-async def dashboard(request: Request):
+async def dashboard(request: Request, cursor: str = None):
     token = request.cookies.get("admin_token")
     if token != config.upload_password:
         return RedirectResponse(url="/admin")
     
-    apps = db.list_apps(sort_by="created")
-    return templates.TemplateResponse("admin/dashboard.html", {"request": request, "apps": apps})
+    try:
+        page = await async_db.list_apps_page(sort_by="created_desc", limit=config.admin_page_size, cursor=cursor)
+    except ValueError:
+        return RedirectResponse(url="/admin/dashboard")
+    return templates.TemplateResponse("admin/dashboard.html", {
+        "request": request,
+        "apps": page["items"],
+        "next_cursor": page["next_cursor"]
+    })
 
 @router.get("/edit/{slug}", response_class=HTMLResponse)
 async def edit_page(request: Request, slug: str):
@@ -36,7 +44,7 @@ async def edit_page(request: Request, slug: str):
     if token != config.upload_password:
         return RedirectResponse(url="/admin")
     
-    app = db.get_app(slug)
+    app = await async_db.get_app(slug)
     if not app:
         raise HTTPException(status_code=404, detail="App not found")
         
@@ -54,8 +62,8 @@ async def edit_app(
     if token != config.upload_password:
         raise HTTPException(status_code=401, detail="Unauthorized")
         
-    db.update_app(slug=slug, name=name, description=description, author=author)
-    logger.info(f"Admin updated app: {slug}")
+    await async_db.update_app(slug=slug, name=name, description=description, author=author)
+    logger.info("Admin updated app: {}", slug)
     return RedirectResponse(url="/admin/dashboard", status_code=303)
 
 @router.post("/api/delete/{slug}")
@@ -71,8 +79,8 @@ async def delete_app(slug: str, request: Request):
     
     # Actually, I should update database.py first or concurrently.
     # I'll assume I'll update database.py next.
-    db.delete_app(slug) 
-    logger.info(f"Admin deleted app: {slug}")
+    await async_db.delete_app(slug) 
+    logger.info("Admin deleted app: {}", slug)
     return RedirectResponse(url="/admin/dashboard", status_code=303)
 
 @router.get("/logout")
@@ -82,6 +90,7 @@ async def logout():
     return response
 
 from src.services.file_service import FileService
+from src.services.cloudflare_service import CloudflareService
 
 @router.get("/code/{slug}", response_class=HTMLResponse)
 async def edit_code_page(request: Request, slug: str):
@@ -89,7 +98,7 @@ async def edit_code_page(request: Request, slug: str):
     if token != config.upload_password:
         return RedirectResponse(url="/admin")
         
-    app = db.get_app(slug)
+    app = await async_db.get_app(slug)
     if not app:
         raise HTTPException(status_code=404, detail="App not found")
     return templates.TemplateResponse("admin/edit_code.html", {"request": request, "app": app})
@@ -122,3 +131,88 @@ async def save_code(
     except Exception as e:
         logger.error(f"Failed to save code for {slug}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/api/versions/{slug}")
+async def list_versions(slug: str, request: Request):
+    token = request.cookies.get("admin_token")
+    if token != config.upload_password:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    return {"slug": slug, "versions": await asyncio.to_thread(FileService.list_versions, slug)}
+
+@router.post("/api/versions/{slug}/{version}/restore")
+async def restore_version(slug: str, version: str, request: Request):
+    token = request.cookies.get("admin_token")
+    if token != config.upload_password:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    try:
+        await FileService.restore_version(slug, version)
+        return {"status": "success", "version": version}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to restore {slug} to {version}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/api/purge-queue")
+async def purge_queue(request: Request):
+    token = request.cookies.get("admin_token")
+    if token != config.upload_password:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    return {"depth": CloudflareService.queue_depth()}
+
+from src.services.bulk_service import BulkService
+
+@router.post("/api/import")
+async def import_apps(request: Request, file: UploadFile = File(...)):
+    token = request.cookies.get("admin_token")
+    if token != config.upload_password:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    try:
+        return await BulkService.import_archive(file)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk import failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/api/export")
+async def export_apps(request: Request, compress: bool = False):
+    token = request.cookies.get("admin_token")
+    if token != config.upload_password:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    filename = f"ahost-export-{datetime.now().strftime('%Y%m%d-%H%M%S')}.tar" + (".gz" if compress else "")
+    return StreamingResponse(
+        BulkService.stream_export(compress),
+        media_type="application/gzip" if compress else "application/x-tar",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+from src.services.analytics import analytics
+
+@router.get("/api/analytics")
+async def analytics_overview(request: Request, days: int = 7, limit: int = 20):
+    token = request.cookies.get("admin_token")
+    if token != config.upload_password:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    # Include this worker's views since the last rollup
+    await asyncio.to_thread(analytics.flush)
+    days, limit = min(max(days, 1), 366), min(max(limit, 1), 100)
+    return {"days": days, "apps": await asyncio.to_thread(analytics.top, days, limit)}
+
+@router.get("/api/analytics/{slug}")
+async def app_analytics(request: Request, slug: str, granularity: str = "day", periods: int = 30):
+    token = request.cookies.get("admin_token")
+    if token != config.upload_password:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if granularity not in ("hour", "day"):
+        raise HTTPException(status_code=400, detail="granularity must be hour or day")
+
+    await asyncio.to_thread(analytics.flush)
+    periods = min(max(periods, 1), 24 * 31 if granularity == "hour" else 366)
+    return await asyncio.to_thread(analytics.series, slug, granularity, periods)
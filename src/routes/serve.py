@@ -1,18 +1,26 @@
-from fastapi import APIRouter, HTTPException
+from email.utils import formatdate
+from fastapi import APIRouter, HTTPException, Request, Response
 from fastapi.responses import FileResponse
-from pathlib import Path
 from src.config import config
 from src.database import db
+from src.services.analytics import analytics
+from src.services.site_cache import site_cache, accepted_encodings
+from src.services.site_index import site_index, FileInfo
+from src.utils.metrics import SITE_BYTES, SITE_CACHE
 
 router = APIRouter()
 
-@router.get("/{slug}/{path:path}")
-async def serve_app_file(slug: str, path: str):
-    # Check if app exists in DB (optional, but good for consistency)
-    # app = db.get_app(slug)
-    # if not app:
-    #     raise HTTPException(status_code=404, detail="App not found")
+# Fingerprinted asset URLs change whenever their content does
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+def _not_modified(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
 
+def _info_from_disk(slug: str, path: str) -> FileInfo:
+    """Resolve a file of a site that predates manifests by probing its directory."""
     base_path = config.upload_dir / slug
     file_path = base_path / path
 
@@ -25,15 +33,78 @@ async def serve_app_file(slug: str, path: str):
     if file_path.is_dir():
         file_path = file_path / "index.html"
 
-    if not file_path.exists():
+    try:
+        return FileInfo.from_stat(file_path, file_path.stat())
+    except (FileNotFoundError, NotADirectoryError):
         raise HTTPException(status_code=404, detail="File not found")
 
-    return FileResponse(file_path)
+@router.get("/{slug}/{path:path}")
+async def serve_app_file(request: Request, slug: str, path: str):
+    # Check if app exists in DB (optional, but good for consistency)
+    # app = db.get_app(slug)
+    # if not app:
+    #     raise HTTPException(status_code=404, detail="App not found")
+
+    entry = site_cache.get(slug, path)
+    if entry is None:
+        generation = site_cache.generation(slug)
+        site = await site_index.get(slug)
+        if site is not None:
+            info = site.resolve(path)
+            if info is None:
+                raise HTTPException(status_code=404, detail="File not found")
+        else:
+            info = _info_from_disk(slug, path)
+
+        entry = await site_cache.load(info)
+        if entry is None:
+            SITE_CACHE.inc(result="uncacheable")
+            # Too big for the memory cache: stream it, still honouring If-None-Match
+            headers = {}
+            if info.etag:
+                headers = {"ETag": f'"{info.etag}"', "Last-Modified": formatdate(info.mtime, usegmt=True)}
+            if info.immutable:
+                headers["Cache-Control"] = IMMUTABLE
+            response = FileResponse(info.path, media_type=info.media_type, headers=headers,
+                                    stat_result=info.path.stat())
+            if _not_modified(request, response.headers["etag"]):
+                return Response(status_code=304, headers={"ETag": response.headers["etag"]})
+            SITE_BYTES.inc(info.size, slug=slug)
+            return response
+        SITE_CACHE.inc(result="miss")
+        site_cache.put(slug, path, entry, generation)
+    else:
+        SITE_CACHE.inc(result="hit")
+
+    body, encoding = entry.body, None
+    if entry.variants:
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        for candidate in ("br", "gzip"):
+            if candidate in entry.variants and candidate in accepted:
+                body, encoding = entry.variants[candidate], candidate
+                break
+
+    # Strong validators must differ between encoded representations
+    etag = f'"{entry.etag}-{encoding}"' if encoding else f'"{entry.etag}"'
+    headers = {"ETag": etag, "Last-Modified": entry.last_modified}
+    if entry.variants:
+        headers["Vary"] = "Accept-Encoding"
+    if entry.immutable:
+        headers["Cache-Control"] = IMMUTABLE
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    SITE_BYTES.inc(len(body), slug=slug)
+    return Response(content=body, media_type=entry.media_type, headers=headers)
 
 @router.get("/{slug}")
-async def serve_app_root(slug: str):
-    # Increment view count
+async def serve_app_root(request: Request, slug: str):
+    # Increment view count (buffered in memory, so fine on the event loop)
     db.increment_view_count(slug)
     
     # Serve index.html
-    return await serve_app_file(slug, "index.html")
+    response = await serve_app_file(request, slug, "index.html")
+    # In-memory counters only; rolled up to the database in the background
+    analytics.record(slug, request.scope)
+    return response
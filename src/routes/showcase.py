@@ -1,37 +1,78 @@
-from fastapi import APIRouter, Request, HTTPException, Form
+import asyncio
+from fastapi import APIRouter, Request, HTTPException, Form, Query, Response
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from src.database import db
+from src.database import async_db
 from src.services.qr_service import QRService
+from src.services.page_cache import page_cache
 from src.config import config
+from src.utils.templates import templates
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 @router.get("/i/{slug}", response_class=HTMLResponse)
 async def showcase_app(request: Request, slug: str):
-    app = db.get_app(slug)
+    html = page_cache.get(slug, "showcase")
+    if html is not None:
+        return HTMLResponse(html)
+
+    # Taken before the reads, so an invalidation during the render wins
+    generation = page_cache.generation(slug)
+    app = await async_db.get_app(slug)
     if not app:
         raise HTTPException(status_code=404, detail="App not found")
     
-    qr_base64 = QRService.generate_qr_base64(f"{config.base_url}/{slug}")
-    comments = db.get_comments(slug)
+    page = await async_db.get_comments_page(slug, limit=config.comments_page_size)
     
-    return templates.TemplateResponse(
-        "showcase.html", 
+    html = templates.get_template("showcase.html").render(
         {
             "request": request, 
             "app": app, 
-            "qr_code": qr_base64,
-            "comments": comments
+            "comments": page["items"],
+            "next_cursor": page["next_cursor"]
         }
     )
+    page_cache.put(slug, "showcase", html, generation)
+    return HTMLResponse(html)
+
+@router.get("/api/comments/{slug}")
+async def list_comments(
+    slug: str,
+    cursor: str = None,
+    limit: int = Query(None, ge=1, le=100),
+    html: bool = False
+):
+    try:
+        page = await async_db.get_comments_page(slug, limit=limit or config.comments_page_size, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = {"items": page["items"], "next_cursor": page["next_cursor"]}
+    if html:
+        result["html"] = templates.get_template("partials/comments.html").render(comments=page["items"])
+    return result
+
+@router.get("/qr/{slug}.{fmt}")
+async def qr_code(request: Request, slug: str, fmt: str, size: int = Query(10, ge=1, le=40)):
+    if fmt not in QRService.MEDIA_TYPES:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not await async_db.get_app(slug):
+        raise HTTPException(status_code=404, detail="App not found")
+
+    # Disk reads and rendering block, so keep them off the event loop
+    content, etag = await asyncio.to_thread(QRService.get_qr, f"{config.base_url}/{slug}", box_size=size, fmt=fmt)
+    headers = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": "public, max-age=86400"
+    }
+    if f'"{etag}"' in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type=QRService.MEDIA_TYPES[fmt], headers=headers)
 
 @router.post("/api/comment/{slug}")
 async def add_comment(slug: str, content: str = Form(...), author: str = Form("Anonymous")):
-    app = db.get_app(slug)
+    app = await async_db.get_app(slug)
     if not app:
         raise HTTPException(status_code=404, detail="App not found")
     
-    db.add_comment(slug, content, author)
+    await async_db.add_comment(slug, content, author)
     return RedirectResponse(url=f"/i/{slug}", status_code=303)
@@ -0,0 +1,197 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from src.config import config
+from src.database import db
+from src.utils.hll import HyperLogLog
+from src.utils.logger import logger
+from src.utils.rate_limit import client_ip
+
+def _hour_label(minute: int) -> str:
+    """Local-time hour bucket of a minute since the epoch, e.g. "2024-05-01 13:00"."""
+    return datetime.fromtimestamp(minute * 60).strftime("%Y-%m-%d %H:00")
+
+class ViewAnalytics:
+    """
+    Page view analytics per app, fed by serve_app_root.
+
+    record() only bumps an in-memory per-minute counter and adds the visitor
+    (a hash of IP and user agent) to that hour's HyperLogLog sketch. Every
+    ANALYTICS_FLUSH_INTERVAL seconds a background thread rolls the pending
+    minutes up into the hourly and daily tables in one transaction. The last
+    ANALYTICS_RECENT_MINUTES of minute counts are kept in memory for a live
+    view; with several workers each one only sees its own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Not yet rolled up: (slug, minute) -> views and (slug, hour) -> visitors
+        self._minutes: Dict[Tuple[str, int], int] = {}
+        self._sketches: Dict[Tuple[str, str], HyperLogLog] = {}
+        # Rolled up, kept for the live view: slug -> minute -> views
+        self._recent: Dict[str, Dict[int, int]] = {}
+        self._minute = 0
+        self._hour = ""
+        self._last_prune = 0.0
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def record(self, slug: str, scope: Dict[str, Any]):
+        if not config.analytics:
+            return
+        minute = int(time.time() // 60)
+        if minute != self._minute:
+            self._hour, self._minute = _hour_label(minute), minute
+        hour = self._hour
+
+        user_agent = b""
+        for name, value in scope.get("headers") or ():
+            if name == b"user-agent":
+                user_agent = value
+                break
+        visitor = client_ip(scope).encode() + b"|" + user_agent
+
+        with self._lock:
+            key = (slug, minute)
+            self._minutes[key] = self._minutes.get(key, 0) + 1
+            sketch = self._sketches.get((slug, hour))
+            if sketch is None:
+                sketch = self._sketches[(slug, hour)] = HyperLogLog()
+            sketch.add(visitor)
+        if self._thread is None:
+            self.start()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                minutes, self._minutes = self._minutes, {}
+                sketches, self._sketches = self._sketches, {}
+            if not minutes:
+                return
+
+            hourly: Dict[Tuple[str, str], List[Any]] = {}
+            for (slug, minute), views in minutes.items():
+                hourly.setdefault((slug, _hour_label(minute)), [0, None])[0] += views
+            for key, sketch in sketches.items():
+                hourly.setdefault(key, [0, None])[1] = sketch
+            daily: Dict[Tuple[str, str], List[Any]] = {}
+            for (slug, hour), (views, sketch) in hourly.items():
+                day = daily.setdefault((slug, hour[:10]), [0, HyperLogLog()])
+                day[0] += views
+                if sketch is not None:
+                    day[1].merge(sketch)
+
+            prune = None
+            if time.time() - self._last_prune > 3600:
+                cutoff = datetime.now() - timedelta(days=config.analytics_hourly_retention_days)
+                prune = cutoff.strftime("%Y-%m-%d %H:00")
+            try:
+                db.add_view_stats({
+                    "hour": {key: (views, sketch.to_bytes() if sketch else None) for key, (views, sketch) in hourly.items()},
+                    "day": {key: (views, sketch.to_bytes()) for key, (views, sketch) in daily.items()},
+                }, prune_hours_before=prune)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write view analytics for {len(hourly)} app-hours: {e}")
+                # Put them back for the next flush
+                with self._lock:
+                    for key, views in minutes.items():
+                        self._minutes[key] = self._minutes.get(key, 0) + views
+                    for key, sketch in sketches.items():
+                        if key in self._sketches:
+                            self._sketches[key].merge(sketch)
+                        else:
+                            self._sketches[key] = sketch
+                return
+            if prune is not None:
+                self._last_prune = time.time()
+
+            oldest = int(time.time() // 60) - config.analytics_recent_minutes
+            for (slug, minute), views in minutes.items():
+                counts = self._recent.setdefault(slug, {})
+                counts[minute] = counts.get(minute, 0) + views
+            for slug in list(self._recent):
+                counts = {m: v for m, v in self._recent[slug].items() if m >= oldest}
+                if counts:
+                    self._recent[slug] = counts
+                else:
+                    del self._recent[slug]
+
+    def recent(self, slug: str) -> List[Dict[str, Any]]:
+        """Views per minute of the last ANALYTICS_RECENT_MINUTES in this worker, oldest first."""
+        oldest = int(time.time() // 60) - config.analytics_recent_minutes
+        counts = dict(self._recent.get(slug, {}))
+        with self._lock:
+            for (key_slug, minute), views in self._minutes.items():
+                if key_slug == slug:
+                    counts[minute] = counts.get(minute, 0) + views
+        return [
+            {"minute": datetime.fromtimestamp(minute * 60).strftime("%Y-%m-%d %H:%M"), "views": views}
+            for minute, views in sorted(counts.items()) if minute >= oldest
+        ]
+
+    @staticmethod
+    def _since(granularity: str, periods: int) -> str:
+        if granularity == "hour":
+            return (datetime.now() - timedelta(hours=periods - 1)).strftime("%Y-%m-%d %H:00")
+        return (datetime.now() - timedelta(days=periods - 1)).strftime("%Y-%m-%d")
+
+    def series(self, slug: str, granularity: str = "day", periods: int = 30) -> Dict[str, Any]:
+        """Views and unique visitors of slug per hour or day, over the last `periods` of them."""
+        rows = db.get_view_stats(granularity, self._since(granularity, periods), slug)
+        return {
+            "slug": slug,
+            "granularity": granularity,
+            "series": [
+                {"bucket": row["bucket"], "views": row["views"], "uniques": HyperLogLog.union([row["sketch"]]).count()}
+                for row in rows
+            ],
+            "views": sum(row["views"] for row in rows),
+            # Sketches merge, so visitors seen in several buckets count once
+            "uniques": HyperLogLog.union(row["sketch"] for row in rows).count(),
+            "recent": self.recent(slug),
+        }
+
+    def top(self, days: int = 7, limit: int = 20) -> List[Dict[str, Any]]:
+        """The most viewed apps over the last `days` days, with their unique visitors."""
+        since = self._since("day", days)
+        apps = db.top_view_stats(since, limit)
+        if not apps:
+            return apps
+        sketches: Dict[str, List[bytes]] = {}
+        for row in db.get_view_stats("day", since, slugs=[app["slug"] for app in apps]):
+            sketches.setdefault(row["slug"], []).append(row["sketch"])
+        for app in apps:
+            app["uniques"] = HyperLogLog.union(sketches.get(app["slug"], ())).count()
+        return apps
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="analytics-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(config.analytics_flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"View analytics flush failed: {e}")
+
+analytics = ViewAnalytics()
@@ -0,0 +1,75 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Tuple
+from src.config import config
+from src.services.blob_store import blob_store
+from src.utils.assets import OPTIMIZABLE_SUFFIXES, optimize_file
+
+class AssetOptimizer:
+    """
+    Opt-in (OPTIMIZE_ASSETS) pass over a freshly extracted upload: minifies
+    HTML/CSS/JS and recompresses PNG/JPEG images in a process pool. Files only
+    change when the result is smaller, and originals go to the blob store so
+    the manifest can point back at them.
+    """
+
+    _pool = None
+
+    @classmethod
+    def _get_pool(cls) -> ProcessPoolExecutor:
+        if cls._pool is None:
+            # spawn, not fork: the server process has database and logging threads
+            cls._pool = ProcessPoolExecutor(
+                max_workers=config.optimize_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return cls._pool
+
+    @classmethod
+    async def optimize_site(cls, site_dir: Path) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+        """
+        Optimize the assets under site_dir in place. Returns manifest entries
+        for the originals of the files that changed, by relative path, and the
+        deploy's before/after byte counts.
+        """
+        paths = await asyncio.to_thread(cls._candidates, site_dir)
+        loop = asyncio.get_running_loop()
+        pool = cls._get_pool()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, optimize_file, str(path), config.optimize_jpeg_quality,
+                                 config.optimize_max_image_dimension)
+            for path in paths
+        ))
+        changed = [(path, result) for path, result in zip(paths, results) if result is not None]
+        originals = await asyncio.to_thread(cls._keep_originals, site_dir, [path for path, _ in changed])
+        report = {
+            "files": len(changed),
+            "before": sum(before for _, (before, _) in changed),
+            "after": sum(after for _, (_, after) in changed),
+        }
+        return originals, report
+
+    @staticmethod
+    def _candidates(site_dir: Path) -> list:
+        return [
+            path for path in sorted(site_dir.rglob("*"))
+            if path.suffix.lower() in OPTIMIZABLE_SUFFIXES and path.is_file() and not path.is_symlink()
+            and path.stat().st_size <= config.optimize_max_file_size
+        ]
+
+    @staticmethod
+    def _keep_originals(site_dir: Path, paths: list) -> Dict[str, Dict[str, Any]]:
+        originals = {}
+        for path in paths:
+            originals[path.relative_to(site_dir).as_posix()] = blob_store.put_file(path)
+            os.replace(f"{path}.opt", path)
+        return originals
+
+    @classmethod
+    def shutdown(cls):
+        if cls._pool is not None:
+            cls._pool.shutdown(wait=True, cancel_futures=True)
+            cls._pool = None
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import stat
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from src.config import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: worker processes are not serialized against each other
+    fcntl = None
+
+class BlobStore:
+    """
+    Content-addressed storage for deployed sites.
+
+    Every file is stored once under blobs/<hash[:2]>/<hash>, and each deployed
+    version of a slug is a small JSON manifest mapping relative paths to blob
+    hashes. Working trees are built from hardlinks to the blobs, so files that
+    did not change between deploys cost neither disk space nor copies. Blobs
+    are read-only: anything that wants to change a file must write a new blob.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.blobs_dir = root / "blobs"
+        self.manifests_dir = root / "manifests"
+        self.staging_dir = root / "staging"
+        self.releases_dir = root / "releases"
+        self._locks = [threading.Lock() for _ in range(64)]
+
+    @contextmanager
+    def lock(self, slug: str) -> Iterator[None]:
+        """
+        Serialize changes to slug's versions (new manifests, CURRENT and the
+        live release), across threads and, through a lock file, across
+        worker processes. Not reentrant.
+        """
+        with self._locks[hash(slug) % len(self._locks)]:
+            if fcntl is None:
+                yield
+                return
+            directory = self.manifests_dir / slug
+            directory.mkdir(parents=True, exist_ok=True)
+            with open(directory / ".lock", "a") as lock_file:
+                # Released when the file is closed
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blobs_dir / digest[:2] / digest
+
+    def release_dir(self, slug: str, version: str) -> Path:
+        return self.releases_dir / slug / version
+
+    def new_staging_dir(self, prefix: str) -> Path:
+        path = self.staging_dir / f"{prefix}-{uuid.uuid4().hex[:12]}"
+        path.mkdir(parents=True)
+        return path
+
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _store(self, source: Path, digest: str, move: bool):
+        blob = self.blob_path(digest)
+        if blob.exists():
+            return
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp = blob.with_name(f".{digest}.{uuid.uuid4().hex[:8]}")
+        if move:
+            shutil.move(str(source), str(tmp))
+        else:
+            shutil.copyfile(source, tmp)
+        os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(tmp, blob)
+
+    @staticmethod
+    def file_entry(name: str, digest: str, size: int, mtime: float) -> Dict[str, Any]:
+        """A manifest file entry; carries what serving needs so it never has to stat."""
+        return {
+            "hash": digest,
+            "size": size,
+            "mtime": int(mtime),
+            "type": mimetypes.guess_type(name)[0] or "application/octet-stream",
+        }
+
+    def put_bytes(self, data: bytes, name: str = "") -> Dict[str, Any]:
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self.blob_path(digest)
+        if not blob.exists():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            tmp = blob.with_name(f".{digest}.{uuid.uuid4().hex[:8]}")
+            tmp.write_bytes(data)
+            os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp, blob)
+        return self.file_entry(name, digest, len(data), time.time())
+
+    def ingest(self, source_dir: Path, move: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Add every file under source_dir to the store and return the manifest
+        file map. Files are moved into the store unless move is False.
+        """
+        files = {}
+        for path in sorted(source_dir.rglob("*")):
+            if not path.is_file() or path.is_symlink():
+                continue
+            files[path.relative_to(source_dir).as_posix()] = self.put_file(path, move)
+        return files
+
+    def put_file(self, path: Path, move: bool = True) -> Dict[str, Any]:
+        """Add one file to the store and return its manifest entry."""
+        digest = self._hash_file(path)
+        info = path.stat()
+        self._store(path, digest, move)
+        return self.file_entry(path.name, digest, info.st_size, info.st_mtime)
+
+    def commit(self, slug: str, files: Dict[str, Dict[str, Any]], note: str = None,
+               optimized: Dict[str, int] = None) -> Dict[str, Any]:
+        """Write a new manifest version for slug and return it."""
+        now = datetime.now()
+        # Sorts chronologically as a plain string
+        version = f"{now.strftime('%Y%m%d%H%M%S%f')}-{uuid.uuid4().hex[:6]}"
+        manifest = {
+            "slug": slug,
+            "version": version,
+            "created_at": now.isoformat(timespec="seconds"),
+            "note": note,
+            "files": files,
+        }
+        if optimized:
+            # Byte counts from the asset optimizer, for the deploy history
+            manifest["optimized"] = optimized
+        directory = self.manifests_dir / slug
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp = directory / f".{version}.tmp"
+        tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+        os.replace(tmp, directory / f"{version}.json")
+        return manifest
+
+    def get_manifest(self, slug: str, version: str) -> Optional[Dict[str, Any]]:
+        path = self.manifests_dir / slug / f"{version}.json"
+        if "/" in version or not path.is_file():
+            return None
+        return json.loads(path.read_text())
+
+    def list_versions(self, slug: str) -> List[Dict[str, Any]]:
+        directory = self.manifests_dir / slug
+        if not directory.is_dir():
+            return []
+        versions = []
+        for path in sorted(directory.glob("*.json"), reverse=True):
+            manifest = json.loads(path.read_text())
+            versions.append({
+                "version": manifest["version"],
+                "created_at": manifest["created_at"],
+                "note": manifest.get("note"),
+                "files": len(manifest["files"]),
+                "size": sum(entry["size"] for entry in manifest["files"].values()),
+                "optimized": manifest.get("optimized"),
+            })
+        return versions
+
+    def current_version(self, slug: str) -> Optional[str]:
+        try:
+            return (self.manifests_dir / slug / "CURRENT").read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def current_manifest(self, slug: str) -> Optional[Dict[str, Any]]:
+        version = self.current_version(slug)
+        return self.get_manifest(slug, version) if version else None
+
+    def set_current(self, slug: str, version: str):
+        directory = self.manifests_dir / slug
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp = directory / f".CURRENT.{uuid.uuid4().hex[:8]}"
+        tmp.write_text(version)
+        os.replace(tmp, directory / "CURRENT")
+
+    def checkout(self, manifest: Dict[str, Any], target_dir: Path):
+        """Build a working tree for manifest in target_dir out of hardlinks."""
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for rel_path, entry in manifest["files"].items():
+            dest = target_dir / rel_path
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            blob = self.blob_path(entry["hash"])
+            try:
+                os.link(blob, dest)
+            except OSError:
+                # Different filesystem or no hardlink support: fall back to a copy
+                shutil.copyfile(blob, dest)
+
+    def prune_releases(self, slug: str, keep: int, current: str):
+        """Remove checked-out releases of slug beyond the newest `keep` (never the current one)."""
+        directory = self.releases_dir / slug
+        if not directory.is_dir():
+            return
+        releases = sorted((p for p in directory.iterdir() if p.is_dir()), key=lambda p: p.name, reverse=True)
+        for release in releases[keep:]:
+            if release.name != current:
+                shutil.rmtree(release, ignore_errors=True)
+
+blob_store = BlobStore(config.store_dir)
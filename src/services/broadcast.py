@@ -0,0 +1,71 @@
+import asyncio
+import os
+from typing import Callable, Dict, List, Optional
+from src.config import config
+from src.database import db, async_db
+from src.utils.logger import logger
+
+class Broadcast:
+    """
+    Cache invalidation across worker processes.
+
+    Every worker keeps its own in-memory caches, so changes are appended to
+    the events table in the shared SQLite database and each worker polls it
+    every BROADCAST_INTERVAL seconds, handing events from other processes to
+    the local subscribers. The same poll re-reads config.json when it changed.
+    """
+
+    def __init__(self):
+        self.origin = os.getpid()
+        self._handlers: Dict[str, List[Callable[[str], None]]] = {}
+        self._last_id = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, kind: str, handler: Callable[[str], None]):
+        self._handlers.setdefault(kind, []).append(handler)
+
+    def publish(self, kind: str, *keys: str):
+        """
+        Tell the other workers, in one write however many keys. Blocks on
+        SQLite, so call it off the event loop.
+        """
+        try:
+            db.publish_events(self.origin, [(kind, key) for key in keys])
+        except Exception as e:
+            logger.error(f"Failed to broadcast {kind} {', '.join(keys)}: {e}")
+
+    async def poll(self):
+        config.reload_if_changed()
+        for event in await async_db.get_events(self._last_id, self.origin):
+            self._last_id = event["id"]
+            for handler in self._handlers.get(event["kind"], ()):
+                try:
+                    handler(event["key"])
+                except Exception as e:
+                    logger.error(f"Broadcast handler for {event['kind']} {event['key']} failed: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(config.broadcast_interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"Broadcast poll failed: {e}")
+
+    async def start(self):
+        # Everything before startup is already reflected in the empty caches
+        self._last_id = await async_db.last_event_id()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+broadcast = Broadcast()
+# Writes through Database change what other workers have rendered too
+db.add_listener(lambda slugs: broadcast.publish("app", *slugs))
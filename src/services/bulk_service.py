@@ -0,0 +1,356 @@
+import asyncio
+import io
+import json
+import os
+import queue
+import shutil
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from fastapi import HTTPException, UploadFile
+import aiofiles
+from src.config import config
+from src.database import db
+from src.utils.logger import logger
+from src.services.blob_store import blob_store
+from src.services.broadcast import broadcast
+from src.services.cloudflare_service import CloudflareService
+from src.services.file_service import FileService
+from src.services.fingerprint import fingerprint_site
+from src.services.site_cache import precompress_site
+
+MANIFEST_NAME = "apps.json"
+# Exports write one apps/<slug>.json per app instead, next to its site files
+APPS_DIR = "apps"
+SITES_DIR = "sites"
+# Columns of an exported app row; the rest (id, comment_count) is rebuilt on import
+APP_FIELDS = ("slug", "name", "description", "author", "created_at", "view_count")
+# Bytes handed to the response at a time while streaming an export
+EXPORT_CHUNK_SIZE = 256 * 1024
+# App rows read from the database at a time while exporting
+EXPORT_PAGE_SIZE = 100
+
+# Deploys sites for imports. Long-lived: a thread that touches the database
+# keeps its connection until Database.close(), so threads are reused, not
+# started per import
+_import_pool = ThreadPoolExecutor(max_workers=max(1, config.import_workers), thread_name_prefix="import")
+
+class _ExportCancelled(Exception):
+    pass
+
+class _QueueWriter(io.RawIOBase):
+    """Write-only file that hands what tarfile writes to a bounded queue, in chunks."""
+
+    def __init__(self, chunks: "queue.Queue[Optional[bytes]]", cancelled: threading.Event):
+        self._chunks = chunks
+        self._cancelled = cancelled
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        if len(self._buffer) >= EXPORT_CHUNK_SIZE:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+
+    def _put(self, chunk: bytes):
+        # A full queue means the client is slow: wait for it, unless it went away
+        while True:
+            if self._cancelled.is_set():
+                raise _ExportCancelled()
+            try:
+                self._chunks.put(chunk, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+class BulkService:
+    """
+    Bulk import and export of apps.
+
+    Both use the same layout, as a directory or a tar archive: apps.json holds
+    the app rows (with their comments) and sites/<slug>/ each app's files, so
+    an export can be imported as is. Exports write each row to its own
+    apps/<slug>.json instead, so they never hold more than one app. Imports deploy IMPORT_WORKERS sites at a
+    time and register them IMPORT_BATCH_SIZE apps per database transaction.
+    """
+
+    @staticmethod
+    def _valid_slug(slug: Any) -> bool:
+        return (isinstance(slug, str) and bool(slug) and slug not in (".", "..")
+                and not slug.startswith(".") and "/" not in slug and "\\" not in slug)
+
+    @staticmethod
+    def _is_root(path: Path) -> bool:
+        return (path / MANIFEST_NAME).is_file() or (path / APPS_DIR).is_dir()
+
+    @staticmethod
+    def _find_root(extract_dir: Path) -> Path:
+        """The directory holding apps.json or apps/: the archive root, or its single top-level folder."""
+        if BulkService._is_root(extract_dir):
+            return extract_dir
+        entries = [path for path in extract_dir.iterdir()]
+        if len(entries) == 1 and entries[0].is_dir() and BulkService._is_root(entries[0]):
+            return entries[0]
+        raise HTTPException(status_code=400, detail=f"Import does not contain an {MANIFEST_NAME} or {APPS_DIR}/")
+
+    @staticmethod
+    def read_manifest(root: Path) -> List[Dict[str, Any]]:
+        if not (root / MANIFEST_NAME).is_file() and (root / APPS_DIR).is_dir():
+            apps = []
+            for path in sorted((root / APPS_DIR).glob("*.json")):
+                try:
+                    apps.append(json.loads(path.read_text(encoding="utf-8")))
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=f"Invalid {APPS_DIR}/{path.name}: {e}")
+            return apps
+        try:
+            data = json.loads((root / MANIFEST_NAME).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise HTTPException(status_code=400, detail=f"Import does not contain an {MANIFEST_NAME}")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid {MANIFEST_NAME}: {e}")
+        apps = data.get("apps") if isinstance(data, dict) else data
+        if not isinstance(apps, list):
+            raise HTTPException(status_code=400, detail=f"{MANIFEST_NAME} must list the apps to import")
+        return apps
+
+    @staticmethod
+    def _site_dir(root: Path, app: Dict[str, Any]) -> Path:
+        site_dir = (root / app.get("dir", f"{SITES_DIR}/{app['slug']}")).resolve()
+        if not site_dir.is_relative_to(root.resolve()):
+            raise ValueError("Site directory is outside the import")
+        if not (site_dir / "index.html").is_file():
+            raise ValueError("Site does not contain an index.html")
+        return site_dir
+
+    @staticmethod
+    def _deploy(root: Path, app: Dict[str, Any], move: bool) -> List[str]:
+        """Publish one app's site as a new version; returns the paths to purge."""
+        slug = app["slug"]
+        site_dir = BulkService._site_dir(root, app)
+        staging_dir = blob_store.new_staging_dir(slug)
+        try:
+            if move:
+                os.replace(site_dir, staging_dir / "site")
+            else:
+                # Links in a local directory could point anywhere: leave them out
+                shutil.copytree(site_dir, staging_dir / "site",
+                                ignore=lambda d, names: [n for n in names if os.path.islink(os.path.join(d, n))])
+            site = staging_dir / "site"
+            fingerprinted = fingerprint_site(site) if config.fingerprint_assets else {}
+            precompress_site(site)
+            previous = blob_store.current_manifest(slug)
+            manifest = FileService._commit_staged(slug, site, fingerprinted=fingerprinted)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        # The other workers are told once per batch, by import_directory
+        FileService.invalidate(slug)
+        return FileService._changed_paths(previous, manifest)
+
+    @staticmethod
+    def import_directory(root: Path, move: bool = False) -> Tuple[Dict[str, Any], Dict[str, List[str]]]:
+        """
+        Deploy and register every app listed in root/apps.json or root/apps/. Blocking; run
+        it off the event loop. Returns a report and, by slug, the paths to purge
+        from the CDN. With move, site directories are moved rather than copied.
+        """
+        apps = BulkService.read_manifest(root)
+        report: Dict[str, Any] = {"imported": 0, "created": 0, "failed": []}
+        purges: Dict[str, List[str]] = {}
+
+        valid, seen = [], set()
+        for app in apps:
+            slug = app.get("slug") if isinstance(app, dict) else None
+            if not BulkService._valid_slug(slug) or slug in seen:
+                report["failed"].append({"slug": slug, "error": "Missing, invalid or duplicate slug"})
+            elif not isinstance(app.get("name"), str) or not app["name"].strip():
+                report["failed"].append({"slug": slug, "error": "Missing name"})
+            else:
+                seen.add(slug)
+                valid.append(app)
+
+        def deploy(app: Dict[str, Any]) -> Optional[str]:
+            try:
+                purges[app["slug"]] = BulkService._deploy(root, app, move)
+                return None
+            except HTTPException as e:
+                return e.detail
+            except Exception as e:
+                logger.error("Failed to import app {}: {}", app["slug"], e)
+                return str(e)
+
+        start = time.perf_counter()
+        batch_size = max(1, config.import_batch_size)
+        for offset in range(0, len(valid), batch_size):
+            batch = valid[offset:offset + batch_size]
+            deployed = []
+            for app, error in zip(batch, _import_pool.map(deploy, batch)):
+                if error is None:
+                    deployed.append(app)
+                else:
+                    report["failed"].append({"slug": app["slug"], "error": error})
+            if deployed:
+                broadcast.publish("site", *(app["slug"] for app in deployed))
+                # Only apps whose site is live get a row
+                report["created"] += db.import_apps(deployed)
+                report["imported"] += len(deployed)
+
+        logger.info("Imported {} app(s) ({} new, {} failed) in {:.1f}s",
+                    report["imported"], report["created"], len(report["failed"]), time.perf_counter() - start)
+        return report, purges
+
+    @staticmethod
+    def extract_archive(archive: Path, dest: Path) -> Path:
+        """Unpack a (possibly compressed) tar into dest in one streaming pass; returns the import root."""
+        members = total = 0
+        try:
+            with tarfile.open(archive, "r|*") as tar:
+                for member in tar:
+                    members += 1
+                    total += member.size
+                    if members > config.import_max_members:
+                        raise HTTPException(status_code=400,
+                                            detail=f"Archive has more than {config.import_max_members} entries")
+                    if total > config.import_max_size:
+                        raise HTTPException(status_code=400, detail="Archive is too large when unpacked")
+                    # The data filter rejects absolute paths, traversal, devices and outside links
+                    tar.extract(member, dest, filter="data")
+        except tarfile.TarError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid archive: {e}")
+        return BulkService._find_root(dest)
+
+    @staticmethod
+    async def import_archive(file: UploadFile) -> Dict[str, Any]:
+        work_dir = blob_store.new_staging_dir("import")
+        try:
+            archive = work_dir / "import.tar"
+            written = 0
+            async with aiofiles.open(archive, "wb") as out_file:
+                while chunk := await file.read(config.upload_chunk_size):
+                    written += len(chunk)
+                    if written > config.import_max_size:
+                        raise HTTPException(status_code=413, detail="Archive is too large")
+                    await out_file.write(chunk)
+
+            root = await asyncio.to_thread(BulkService.extract_archive, archive, work_dir / "tree")
+            # Extracted under the store, so sites can be moved into staging instead of copied
+            report, purges = await asyncio.to_thread(BulkService.import_directory, root, True)
+            await BulkService.purge(purges)
+            return report
+        finally:
+            await asyncio.to_thread(shutil.rmtree, work_dir, True)
+
+    @staticmethod
+    async def purge(purges: Dict[str, List[str]]):
+        # Only enqueues; the purge worker sends it all in full batches
+        urls = [url for slug, paths in purges.items() for url in CloudflareService.urls_for(slug, paths)]
+        if urls:
+            await CloudflareService.purge_urls(urls)
+
+    @staticmethod
+    def _app_rows() -> Iterator[Dict[str, Any]]:
+        """Every app row, oldest first, read a page at a time; comments are fetched per app."""
+        after = None
+        while True:
+            apps = db.list_apps(sort_by="created_asc", limit=EXPORT_PAGE_SIZE, after=after)
+            for app in apps:
+                row = {field: app.get(field) for field in APP_FIELDS}
+                # Oldest first, so an import inserts them in their original order
+                row["comments"] = [
+                    {"content": c["content"], "author": c["author"], "created_at": c["created_at"]}
+                    for c in reversed(db.get_comments(app["slug"]))
+                ]
+                yield row
+            if len(apps) < EXPORT_PAGE_SIZE:
+                return
+            after = [apps[-1]["created_at"], apps[-1]["id"]]
+
+    @staticmethod
+    def _site_files(slug: str) -> List[Tuple[str, Path, int, float]]:
+        """(relative path, source, size, mtime) of the files to export for slug."""
+        manifest = blob_store.current_manifest(slug)
+        if manifest is None:
+            # Deployed before the blob store: export the live directory
+            site_dir = config.upload_dir / slug
+            if not site_dir.is_dir():
+                return []
+            files = []
+            for path in sorted(site_dir.rglob("*")):
+                if path.is_file() and not path.is_symlink() and path.suffix not in (".gz", ".br"):
+                    info = path.stat()
+                    files.append((path.relative_to(site_dir).as_posix(), path, info.st_size, info.st_mtime))
+            return files
+
+        entries = manifest["files"]
+        deployed = datetime.fromisoformat(manifest["created_at"]).timestamp()
+        return [
+            (rel_path, blob_store.blob_path(entry["hash"]), entry["size"], entry.get("mtime", deployed))
+            for rel_path, entry in sorted(entries.items())
+            # Precompressed variants are rebuilt on import
+            if not (rel_path[-3:] in (".gz", ".br") and rel_path[:-3] in entries)
+        ]
+
+    @staticmethod
+    def write_export(fileobj: BinaryIO, compress: bool = False):
+        """Write every app's row and current site files to fileobj as a tar stream."""
+        with tarfile.open(fileobj=fileobj, mode="w|gz" if compress else "w|") as tar:
+            for row in BulkService._app_rows():
+                data = json.dumps(row, ensure_ascii=False, indent=1, default=str).encode()
+                info = tarfile.TarInfo(str(PurePosixPath(APPS_DIR, f"{row['slug']}.json")))
+                info.size, info.mtime, info.mode = len(data), int(time.time()), 0o644
+                tar.addfile(info, io.BytesIO(data))
+                for rel_path, source, size, mtime in BulkService._site_files(row["slug"]):
+                    info = tarfile.TarInfo(str(PurePosixPath(SITES_DIR, row["slug"], rel_path)))
+                    info.size, info.mtime, info.mode = size, int(mtime), 0o644
+                    with open(source, "rb") as f:
+                        tar.addfile(info, f)
+        fileobj.flush()
+
+    @staticmethod
+    async def stream_export(compress: bool = False) -> AsyncIterator[bytes]:
+        """
+        The export tar, produced on the fly: a thread writes it into a small
+        bounded queue that this drains, so memory stays flat and nothing is
+        staged on disk however large the sites are.
+        """
+        chunks: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=8)
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                BulkService.write_export(_QueueWriter(chunks, cancelled), compress)
+            except _ExportCancelled:
+                logger.info("Export cancelled by the client")
+            except Exception as e:
+                logger.error("Export failed: {}", e)
+            finally:
+                db.release()
+                # End of stream; once cancelled, only needed to wake a waiting reader
+                while True:
+                    try:
+                        chunks.put(None, timeout=1)
+                        break
+                    except queue.Full:
+                        if cancelled.is_set():
+                            break
+
+        thread = threading.Thread(target=produce, name="export", daemon=True)
+        thread.start()
+        try:
+            while (chunk := await asyncio.to_thread(chunks.get)) is not None:
+                yield chunk
+        finally:
+            cancelled.set()
@@ -1,50 +1,158 @@
+import asyncio
 import urllib.request
+import urllib.error
 import json
+from typing import Dict, List, Optional
 from src.config import config
 from src.utils.logger import logger
+from src.utils.metrics import CF_LATENCY, CF_PURGES, registry
+
+# Cloudflare accepts at most this many URLs per purge_cache call
+MAX_URLS_PER_PURGE = 30
+
+class PurgeError(Exception):
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
 
 class CloudflareService:
+    """
+    Background Cloudflare cache purging.
+
+    purge_cache() only enqueues URLs. A single worker task waits
+    CF_PURGE_DELAY seconds to let repeated purges of the same slug coalesce,
+    then sends them in batches of up to 30 URLs. The blocking HTTP call runs
+    in a thread, and failed batches are retried with exponential backoff.
+    """
+
+    # URL -> None; a dict keeps insertion order and drops duplicates
+    _pending: Dict[str, None] = {}
+    _inflight = 0
+    _wakeup: Optional[asyncio.Event] = None
+    _worker: Optional[asyncio.Task] = None
+
     @staticmethod
-    async def purge_cache(slug: str):
+    async def purge_cache(slug: str, paths: List[str] = None):
         """
         Purge Cloudflare cache for the given app slug.
-        Constructs the URL as https://{domain_name}/{slug}
+        Constructs the URL as https://{domain_name}/{slug}, plus one URL per
+        changed file path of the site (and the directory URL for index pages).
         """
+        await CloudflareService.purge_urls(CloudflareService.urls_for(slug, paths))
+
+    @staticmethod
+    def urls_for(slug: str, paths: List[str] = None) -> List[str]:
+        base = f"https://{config.domain_name}/{slug}"
+        urls = [base]
+        for path in paths or ():
+            urls.append(f"{base}/{path}")
+            if path == "index.html" or path.endswith("/index.html"):
+                urls.append(f"{base}/{path[:-len('index.html')]}")
+        return urls
+
+    @classmethod
+    async def purge_urls(cls, urls: List[str]):
         if not config.cf_zone_id or not config.cf_api_token:
             logger.warning("Cloudflare credentials not configured. Skipping cache purge.")
             return
 
-        url = f"https://api.cloudflare.com/client/v4/zones/{config.cf_zone_id}/purge_cache"
+        for url in urls:
+            cls._pending[url] = None
+        cls._ensure_worker()
+        cls._wakeup.set()
+
+    @classmethod
+    def queue_depth(cls) -> int:
+        return len(cls._pending) + cls._inflight
+
+    @classmethod
+    def _ensure_worker(cls):
+        if cls._worker is None or cls._worker.done():
+            cls._wakeup = asyncio.Event()
+            cls._worker = asyncio.get_running_loop().create_task(cls._run())
+
+    @classmethod
+    async def stop(cls, timeout: float = 10):
+        """Give queued purges a chance to go out, then stop the worker."""
+        if cls._worker is None:
+            return
+        if cls._pending:
+            cls._wakeup.set()
+            try:
+                await asyncio.wait_for(cls._drain(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Dropping {cls.queue_depth()} queued Cloudflare purges on shutdown")
+        cls._worker.cancel()
+        try:
+            await cls._worker
+        except asyncio.CancelledError:
+            pass
+        cls._worker = None
+
+    @classmethod
+    async def _drain(cls):
+        while cls.queue_depth():
+            await asyncio.sleep(0.05)
+
+    @classmethod
+    async def _run(cls):
+        while True:
+            await cls._wakeup.wait()
+            cls._wakeup.clear()
+            # Let a burst of purges for the same slug collapse into one batch
+            await asyncio.sleep(config.cf_purge_delay)
+
+            while cls._pending:
+                batch = list(cls._pending)[:MAX_URLS_PER_PURGE]
+                for url in batch:
+                    del cls._pending[url]
+                cls._inflight = len(batch)
+                try:
+                    await cls._send_with_retry(batch)
+                finally:
+                    cls._inflight = 0
+
+    @classmethod
+    async def _send_with_retry(cls, urls: List[str]):
+        delay = config.cf_purge_backoff
+        for attempt in range(1, config.cf_purge_retries + 1):
+            try:
+                with CF_LATENCY.time():
+                    await asyncio.to_thread(cls._send, urls)
+                CF_PURGES.inc(result="success")
+                logger.info("Successfully purged Cloudflare cache for {} URL(s)", len(urls))
+                return
+            except PurgeError as e:
+                if not e.retryable or attempt == config.cf_purge_retries:
+                    CF_PURGES.inc(result="failure")
+                    logger.error(f"Failed to purge Cloudflare cache for {urls}: {e}")
+                    return
+                CF_PURGES.inc(result="retry")
+                logger.warning(f"Cloudflare purge attempt {attempt} failed, retrying in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    @staticmethod
+    def _send(urls: List[str]):
+        url = f"{config.cf_api_base}/zones/{config.cf_zone_id}/purge_cache"
         headers = {
             "Authorization": f"Bearer {config.cf_api_token}",
             "Content-Type": "application/json"
         }
-        
-        file_url = f"https://{config.domain_name}/{slug}"
-        
-        payload = {
-            "files": [file_url]
-        }
-        
-        data = json.dumps(payload).encode('utf-8')
+        data = json.dumps({"files": urls}).encode('utf-8')
         req = urllib.request.Request(url, data=data, headers=headers, method='POST')
 
         try:
-            # Since this is an async method but urllib is synchronous, 
-            # in a high-load async app we might want to run this in a thread executor.
-            # But for this low-frequency admin action, blocking briefly is acceptable.
-            # Or we can just wrap it in a simple try/except block.
-            
-            with urllib.request.urlopen(req) as response:
-                response_body = response.read().decode('utf-8')
-                result = json.loads(response_body)
-                
-                if result.get("success"):
-                    logger.info(f"Successfully purged Cloudflare cache for {file_url}")
-                else:
-                    logger.error(f"Failed to purge Cloudflare cache: {result.get('errors')}")
-                    
+            with urllib.request.urlopen(req, timeout=10) as response:
+                result = json.loads(response.read().decode('utf-8'))
         except urllib.error.HTTPError as e:
-            logger.error(f"Cloudflare API error: {e.code} - {e.read().decode('utf-8')}")
-        except Exception as e:
-            logger.error(f"Exception during Cloudflare cache purge: {e}")
+            # Rate limiting and server errors are worth retrying, other 4xx are not
+            retryable = e.code == 429 or e.code >= 500
+            raise PurgeError(f"Cloudflare API error: {e.code} - {e.read().decode('utf-8')}", retryable)
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise PurgeError(f"Exception during Cloudflare cache purge: {e}")
+
+        if not result.get("success"):
+            raise PurgeError(f"Cloudflare rejected purge: {result.get('errors')}")
+
+registry.gauge("ahost_cloudflare_purge_queue_depth", "URLs waiting to be purged", CloudflareService.queue_depth)
@@ -1,4 +1,6 @@
+import asyncio
 import os
+import uuid
 import zipfile
 import shutil
 from pathlib import Path
@@ -7,57 +9,193 @@ import aiofiles
 from src.config import config
 from src.utils.logger import logger
 from src.services.cloudflare_service import CloudflareService
-
-import time
+from src.services.site_cache import site_cache, precompress_site, compress_variants
+from src.services.blob_store import blob_store
+from src.services.site_index import site_index
+from src.services.broadcast import broadcast
+from src.services.asset_optimizer import AssetOptimizer
+from src.services.fingerprint import fingerprint_site, rewrite_references
+from src.utils.metrics import ASSET_BYTES, UPLOAD_LATENCY, timed
 
 class FileService:
     @staticmethod
+    @timed(UPLOAD_LATENCY, label="stage")
     async def save_upload(slug: str, file: UploadFile = None, html_content: str = None):
-        upload_dir = config.upload_dir / slug
-        
-        # Backup existing directory if it exists
-        if upload_dir.exists():
-            timestamp = int(time.time())
-            backup_dir = config.upload_dir / f"{slug}_backup_{timestamp}"
-            try:
-                shutil.move(str(upload_dir), str(backup_dir))
-                logger.info(f"Backed up existing app {slug} to {backup_dir}")
-            except Exception as e:
-                logger.error(f"Failed to backup app {slug}: {e}")
-                raise HTTPException(status_code=500, detail=f"Failed to backup existing app: {e}")
-        
-        upload_dir.mkdir(parents=True, exist_ok=True)
+        # Build the new version in a private staging directory; the live site
+        # is only switched over once the new version is complete and valid.
+        staging_dir = blob_store.new_staging_dir(slug)
 
         try:
             if html_content:
-                await FileService._handle_html_content(html_content, upload_dir)
+                await FileService._handle_html_content(html_content, staging_dir)
             elif file:
                 filename = file.filename.lower()
                 if filename.endswith('.zip'):
-                    await FileService._handle_zip(file, upload_dir)
+                    await FileService._handle_zip(file, staging_dir)
                 elif filename.endswith('.html') or filename.endswith('.htm'):
-                    await FileService._handle_html(file, upload_dir)
+                    await FileService._handle_html(file, staging_dir)
                 else:
                     raise HTTPException(status_code=400, detail="Only .zip and .html files are supported")
             else:
                 raise HTTPException(status_code=400, detail="No file or HTML content provided")
             
-            logger.info(f"Successfully saved upload for slug: {slug}")
+            originals, report = {}, None
+            if config.optimize_assets:
+                with UPLOAD_LATENCY.time(stage="optimize"):
+                    originals, report = await AssetOptimizer.optimize_site(staging_dir)
+                ASSET_BYTES.inc(report["before"], stage="before")
+                ASSET_BYTES.inc(report["after"], stage="after")
+                logger.info("Optimized {} file(s) for {}: {} -> {} bytes",
+                            report["files"], slug, report["before"], report["after"])
+
+            fingerprinted = {}
+            if config.fingerprint_assets:
+                with UPLOAD_LATENCY.time(stage="fingerprint"):
+                    fingerprinted = await asyncio.to_thread(fingerprint_site, staging_dir)
+
+            # Build gzip/brotli variants once instead of per request
+            with UPLOAD_LATENCY.time(stage="precompress"):
+                await asyncio.to_thread(precompress_site, staging_dir)
+            previous = await asyncio.to_thread(blob_store.current_manifest, slug)
+            with UPLOAD_LATENCY.time(stage="publish"):
+                manifest = await asyncio.to_thread(
+                    FileService._commit_staged, slug, staging_dir, originals, report, fingerprinted)
+            await FileService._changed(slug)
+
+            logger.info("Successfully saved upload for slug: {} (version {})", slug, manifest["version"])
             
             # Purge Cloudflare cache
-            await CloudflareService.purge_cache(slug)
+            await CloudflareService.purge_cache(slug, FileService._changed_paths(previous, manifest))
             
         except HTTPException:
             # Re-raise HTTP exceptions (like 400 Bad Request)
-            if upload_dir.exists():
-                shutil.rmtree(upload_dir)
             raise
         except Exception as e:
-            # Cleanup on failure
-            if upload_dir.exists():
-                shutil.rmtree(upload_dir)
             logger.error(f"Failed to save upload for slug {slug}: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    @staticmethod
+    def invalidate(slug: str):
+        """Drop everything this worker has cached about slug's files."""
+        # Index first, so a cache fill racing with this cannot pair the new
+        # generation with the old manifest
+        site_index.invalidate(slug)
+        site_cache.invalidate(slug)
+
+    @staticmethod
+    async def _changed(slug: str):
+        FileService.invalidate(slug)
+        await asyncio.to_thread(broadcast.publish, "site", slug)
+
+    @staticmethod
+    def _ensure_history(slug: str):
+        """Record a site deployed before the blob store existed as its first version."""
+        upload_dir = config.upload_dir / slug
+        if blob_store.current_version(slug) is None and upload_dir.is_dir():
+            files = blob_store.ingest(upload_dir, move=False)
+            manifest = blob_store.commit(slug, files, note="imported")
+            blob_store.set_current(slug, manifest["version"])
+            logger.info("Imported existing app {} as version {}", slug, manifest["version"])
+
+    @staticmethod
+    def _commit_staged(slug: str, staging_dir: Path, originals: dict = None, optimized: dict = None,
+                       fingerprinted: dict = None) -> dict:
+        if not (staging_dir / "index.html").is_file():
+            raise HTTPException(status_code=400, detail="Upload does not contain an index.html")
+        # Blobs are content-addressed, so only versioning needs the slug's lock
+        files = blob_store.ingest(staging_dir)
+        # Optimized files remember what was uploaded
+        for rel_path, original in (originals or {}).items():
+            files[rel_path]["original"] = {"hash": original["hash"], "size": original["size"]}
+        # Content-hashed copies never change under their URL
+        for rel_path, copy in (fingerprinted or {}).items():
+            files[rel_path]["fingerprinted"] = copy
+            files[copy]["immutable"] = True
+        with blob_store.lock(slug):
+            FileService._ensure_history(slug)
+            manifest = blob_store.commit(slug, files, optimized=optimized)
+            FileService._publish(slug, manifest)
+        return manifest
+
+    @staticmethod
+    def _publish(slug: str, manifest: dict):
+        """
+        Check out manifest as a release directory and atomically repoint the
+        live data/sites/{slug} symlink at it. Readers always see either the
+        complete previous tree or the complete new one, never a partial one.
+        Callers hold blob_store.lock(slug).
+        """
+        release_dir = blob_store.release_dir(slug, manifest["version"])
+        if not release_dir.is_dir():
+            build_dir = blob_store.new_staging_dir(f"{slug}-build")
+            blob_store.checkout(manifest, build_dir)
+            release_dir.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(build_dir, release_dir)
+
+        upload_dir = config.upload_dir / slug
+        upload_dir.parent.mkdir(parents=True, exist_ok=True)
+
+        parked_dir = None
+        if upload_dir.is_dir() and not upload_dir.is_symlink():
+            # A site from before releases existed is a real directory, which a
+            # symlink cannot atomically replace: park it right before the swap.
+            parked_dir = blob_store.new_staging_dir(f"{slug}-legacy")
+            os.replace(upload_dir, parked_dir / "tree")
+
+        tmp_link = upload_dir.with_name(f".{slug}.{uuid.uuid4().hex[:8]}.link")
+        os.symlink(os.path.relpath(release_dir, upload_dir.parent), tmp_link, target_is_directory=True)
+        os.replace(tmp_link, upload_dir)
+
+        blob_store.set_current(slug, manifest["version"])
+        if parked_dir is not None:
+            shutil.rmtree(parked_dir, ignore_errors=True)
+        blob_store.prune_releases(slug, keep=config.releases_keep, current=manifest["version"])
+
+    @staticmethod
+    def _changed_paths(previous: dict, manifest: dict) -> list:
+        """Paths a CDN may still hold an old copy of after going from previous to manifest."""
+        if previous is None:
+            # Nothing under the slug was served before, apart from its 404s
+            return []
+        old, new = previous["files"], manifest["files"]
+        changed = []
+        for rel_path in sorted(old.keys() | new.keys()):
+            if rel_path[-3:] in (".gz", ".br") and (rel_path[:-3] in old or rel_path[:-3] in new):
+                continue
+            if new.get(rel_path, old.get(rel_path, {})).get("immutable"):
+                continue
+            if old.get(rel_path, {}).get("hash") != new.get(rel_path, {}).get("hash"):
+                changed.append(rel_path)
+        return changed
+
+    @staticmethod
+    def list_versions(slug: str) -> list:
+        current = blob_store.current_version(slug)
+        versions = blob_store.list_versions(slug)
+        for version in versions:
+            version["current"] = version["version"] == current
+        return versions
+
+    @staticmethod
+    async def restore_version(slug: str, version: str):
+        manifest = blob_store.get_manifest(slug, version)
+        if manifest is None:
+            raise HTTPException(status_code=404, detail="Version not found")
+
+        previous = await asyncio.to_thread(blob_store.current_manifest, slug)
+        await asyncio.to_thread(FileService._restore, slug, manifest)
+        await FileService._changed(slug)
+        logger.info("Restored app {} to version {}", slug, version)
+
+        # Purge Cloudflare cache
+        await CloudflareService.purge_cache(slug, FileService._changed_paths(previous, manifest))
+
+    @staticmethod
+    def _restore(slug: str, manifest: dict):
+        with blob_store.lock(slug):
+            FileService._publish(slug, manifest)
 
     @staticmethod
     async def _handle_html_content(content: str, upload_dir: Path):
@@ -65,91 +203,125 @@ class FileService:
         async with aiofiles.open(file_path, 'w', encoding='utf-8') as out_file:
             await out_file.write(content)
 
+    @staticmethod
+    async def _stream_to_disk(file: UploadFile, dest: Path):
+        """Copy an upload to dest in fixed-size chunks, enforcing MAX_UPLOAD_SIZE."""
+        written = 0
+        async with aiofiles.open(dest, 'wb') as out_file:
+            while chunk := await file.read(config.upload_chunk_size):
+                written += len(chunk)
+                if written > config.max_upload_size:
+                    raise HTTPException(status_code=413, detail="Upload is too large")
+                await out_file.write(chunk)
+
     @staticmethod
     async def _handle_html(file: UploadFile, upload_dir: Path):
-        file_path = upload_dir / "index.html"
-        async with aiofiles.open(file_path, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
+        await FileService._stream_to_disk(file, upload_dir / "index.html")
 
     @staticmethod
+    @timed(UPLOAD_LATENCY, label="stage")
     async def _handle_zip(file: UploadFile, upload_dir: Path):
         # Save zip temporarily
         temp_zip_path = upload_dir / "temp.zip"
-        async with aiofiles.open(temp_zip_path, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
-
         try:
-            with zipfile.ZipFile(temp_zip_path, 'r') as zip_ref:
-                # Security check for path traversal
-                for member in zip_ref.namelist():
-                    if '..' in member or member.startswith('/'):
-                        raise HTTPException(status_code=400, detail="Zip file contains unsafe paths")
-                
-                zip_ref.extractall(upload_dir)
-            
-            # Check for index.html
-            index_found = False
-            # Walk through the directory to find index.html
-            # If it's in a subdirectory, we might want to move everything up or just note it
-            # For now, let's assume a simple structure or that the user knows what they are doing.
-            # But the requirement says "Ensure root has index.html (or auto find entry)".
-            
-            # Simple strategy: Look for index.html in the root of extraction
-            if (upload_dir / "index.html").exists():
-                index_found = True
-            else:
-                # Search recursively for index.html
-                for path in upload_dir.rglob("index.html"):
-                    # Move everything from that directory to upload_dir
-                    # This is a bit complex, let's just find the first index.html and set that as root?
-                    # Or just tell the user?
-                    # Let's try to be smart: if there is a single top-level folder, move its contents up.
-                    pass
-            
-            # If still not found, maybe rename the first html file found?
-            if not (upload_dir / "index.html").exists():
-                 html_files = list(upload_dir.rglob("*.html"))
-                 if html_files:
-                     # Rename the first one found to index.html if it's in the root, 
-                     # or if it's deep, we might have issues with relative assets.
-                     # Let's just warn for now or fail if strict.
-                     # Requirement: "Ensure root has index.html (or auto find entry)"
-                     # Let's just try to find *any* index.html and if found, maybe we serve that?
-                     # But serving logic depends on root.
-                     # Let's keep it simple: If no index.html in root, check if there is a single folder and move contents.
-                     items = list(upload_dir.iterdir())
-                     items = [i for i in items if i.name != "temp.zip" and i.name != "__MACOSX"]
-                     
-                     if len(items) == 1 and items[0].is_dir():
-                         # Move contents of this folder to root
-                         subdir = items[0]
-                         for subitem in subdir.iterdir():
-                             shutil.move(str(subitem), str(upload_dir))
-                         subdir.rmdir()
-            
-            if not (upload_dir / "index.html").exists():
-                 # Last resort: find any html file
-                 html_files = list(upload_dir.glob("*.html"))
-                 if html_files:
-                     html_files[0].rename(upload_dir / "index.html")
-                 else:
-                     # Even deeper search?
-                     all_html = list(upload_dir.rglob("*.html"))
-                     if all_html:
-                         # This is risky for relative paths, but let's try
-                         # Ideally we should tell the user to structure their zip correctly.
-                         pass
-
+            await FileService._stream_to_disk(file, temp_zip_path)
+            # Extraction is CPU and disk bound; keep it off the event loop
+            await asyncio.to_thread(FileService._extract_zip, temp_zip_path, upload_dir)
         finally:
             if temp_zip_path.exists():
                 os.remove(temp_zip_path)
 
+    @staticmethod
+    def _check_zip_limits(zip_ref: zipfile.ZipFile):
+        members = zip_ref.infolist()
+        if len(members) > config.zip_max_members:
+            raise HTTPException(status_code=400, detail=f"Zip file has more than {config.zip_max_members} entries")
+
+        total_size = 0
+        for info in members:
+            # Security check for path traversal
+            if '..' in info.filename or info.filename.startswith('/'):
+                raise HTTPException(status_code=400, detail="Zip file contains unsafe paths")
+            total_size += info.file_size
+            # Small files may legitimately compress very well
+            if info.file_size > 1024 * 1024 and info.file_size > info.compress_size * config.zip_max_ratio:
+                raise HTTPException(status_code=400, detail="Zip file has a suspicious compression ratio")
+
+        if total_size > config.zip_max_uncompressed_size:
+            raise HTTPException(status_code=400, detail="Zip file is too large when uncompressed")
+
+    @staticmethod
+    def _zip_layout(names: list) -> tuple:
+        """
+        Where the site starts inside a zip, worked out from its member names:
+        the folder prefix to strip (when everything sits in one top-level
+        folder and there is no root index.html) and, when there is still no
+        index.html, the top-level .html file to serve as one.
+        """
+        files = {name for name in names if not name.endswith("/")}
+        if "index.html" in files:
+            return "", None
+
+        prefix = ""
+        top = names[0].split("/", 1)[0] if names else ""
+        if top and all(name.startswith(top + "/") for name in names):
+            prefix = top + "/"
+        files = {name[len(prefix):] for name in files}
+        if "index.html" in files:
+            return prefix, None
+
+        pages = sorted(name for name in files if "/" not in name and name.endswith(".html"))
+        return prefix, pages[0] if pages else None
+
+    @staticmethod
+    def _extract_zip(temp_zip_path: Path, upload_dir: Path):
+        with zipfile.ZipFile(temp_zip_path, 'r') as zip_ref:
+            # Reject zip bombs from the central directory before writing anything
+            FileService._check_zip_limits(zip_ref)
+
+            # macOS resource forks are never part of the site
+            members = [
+                info for info in zip_ref.infolist()
+                if info.filename.split("/", 1)[0] != "__MACOSX"
+            ]
+            prefix, entry_page = FileService._zip_layout([info.filename for info in members])
+
+            # Headers can lie about sizes, so count what is actually written too
+            budget = config.zip_max_uncompressed_size
+            created = {upload_dir}
+            for info in members:
+                # Each member goes straight to its final path
+                rel_path = info.filename[len(prefix):]
+                if rel_path == entry_page:
+                    rel_path = "index.html"
+                if not rel_path.strip("/"):
+                    continue
+                target = upload_dir / rel_path
+                if info.is_dir():
+                    if target not in created:
+                        target.mkdir(parents=True, exist_ok=True)
+                        created.add(target)
+                    continue
+                if target.parent not in created:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    created.add(target.parent)
+                with zip_ref.open(info) as src, open(target, 'wb') as dst:
+                    while chunk := src.read(config.upload_chunk_size):
+                        budget -= len(chunk)
+                        if budget < 0:
+                            raise HTTPException(status_code=400, detail="Zip file is too large when uncompressed")
+                        dst.write(chunk)
+
     @staticmethod
     async def get_html_content(slug: str) -> str:
         upload_dir = config.upload_dir / slug
         file_path = upload_dir / "index.html"
+
+        # Edit what was uploaded, not the minified copy that is served
+        manifest = await asyncio.to_thread(blob_store.current_manifest, slug)
+        entry = manifest["files"].get("index.html") if manifest else None
+        if entry and "original" in entry:
+            file_path = blob_store.blob_path(entry["original"]["hash"])
         
         if not file_path.exists():
             raise HTTPException(status_code=404, detail="HTML file not found")
@@ -160,20 +332,44 @@ class FileService:
     @staticmethod
     async def save_html_content(slug: str, content: str):
         upload_dir = config.upload_dir / slug
-        file_path = upload_dir / "index.html"
         
         if not upload_dir.exists():
              raise HTTPException(status_code=404, detail="App directory not found")
-             
-        # Backup before saving
-        timestamp = int(time.time())
-        backup_path = upload_dir / f"index.html.bak.{timestamp}"
-        if file_path.exists():
-            shutil.copy2(str(file_path), str(backup_path))
-
-        async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-            await f.write(content)
+
+        # Working trees are hardlinks into the blob store, so never write in
+        # place: store the new index.html as a new version of the site.
+        await asyncio.to_thread(FileService._commit_html, slug, content)
+        await FileService._changed(slug)
             
         # Purge Cloudflare cache
-        await CloudflareService.purge_cache(slug)
+        await CloudflareService.purge_cache(slug, ["index.html"])
+
+    @staticmethod
+    def _commit_html(slug: str, content: str):
+        with blob_store.lock(slug):
+            FileService._commit_html_locked(slug, content)
+
+    @staticmethod
+    def _commit_html_locked(slug: str, content: str):
+        # Reads the current manifest, so the edit must not race another deploy
+        FileService._ensure_history(slug)
+        files = dict(blob_store.current_manifest(slug)["files"])
+
+        # Keep pointing at the fingerprinted copies the last deploy made
+        hashed = {rel_path: entry["fingerprinted"] for rel_path, entry in files.items() if "fingerprinted" in entry}
+        if hashed:
+            content = rewrite_references(content, "index.html", hashed)
+
+        data = content.encode('utf-8')
+        files["index.html"] = blob_store.put_bytes(data, "index.html")
+        variants = compress_variants("index.html", data)
+        for suffix in (".gz", ".br"):
+            if suffix in variants:
+                files[f"index.html{suffix}"] = blob_store.put_bytes(variants[suffix], f"index.html{suffix}")
+            else:
+                files.pop(f"index.html{suffix}", None)
+
+        manifest = blob_store.commit(slug, files, note="edited index.html")
+        FileService._publish(slug, manifest)
 
+broadcast.subscribe("site", FileService.invalidate)
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import posixpath
+import re
+from pathlib import Path
+from typing import Dict
+from urllib.parse import quote, unquote
+from src.utils.logger import logger
+
+# Long enough to never collide within one site, short enough for URLs
+HASH_LENGTH = 10
+
+PAGE_SUFFIXES = {".html", ".htm"}
+STYLESHEET_SUFFIXES = {".css"}
+# Precompressed siblings are served by content negotiation, never by name
+VARIANT_SUFFIXES = {".gz", ".br"}
+
+_CSS_REFERENCE = re.compile(r"""(url\(\s*(["']?))([^"')]+)(\2\s*\))|(@import\s+(["']))([^"']+)(\6)""", re.I)
+_HTML_REFERENCE = re.compile(r"""(\s(?:src|href|poster)\s*=\s*(["']))([^"']+)(\2)""", re.I)
+_EXTERNAL = re.compile(r"^(?:[a-z][a-z0-9+.-]*:|//|/|#)", re.I)
+
+def fingerprinted_name(rel_path: str, digest: str) -> str:
+    """"css/site.css" -> "css/site.<hash>.css"."""
+    directory, name = posixpath.split(rel_path)
+    stem, dot, suffix = name.rpartition(".")
+    name = f"{stem}.{digest}.{suffix}" if dot and stem else f"{name}.{digest}"
+    return posixpath.join(directory, name)
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+def _rewrite_url(url: str, base_dir: str, hashed: Dict[str, str]) -> str:
+    """url as written in a file under base_dir, pointed at its fingerprinted copy if there is one."""
+    stripped = url.strip()
+    if not stripped or _EXTERNAL.match(stripped):
+        return url
+    path = re.split(r"[?#]", stripped, 1)[0]
+    rel_path = posixpath.normpath(posixpath.join(base_dir, unquote(path)))
+    if rel_path not in hashed:
+        return url
+    name = posixpath.basename(hashed[rel_path])
+    head = path.rpartition("/")[0]
+    if "%" in path:
+        name = quote(name)
+    return (f"{head}/{name}" if head else name) + stripped[len(path):]
+
+def rewrite_references(text: str, rel_path: str, hashed: Dict[str, str]) -> str:
+    """Point the asset references of the page or stylesheet at rel_path at their fingerprinted copies."""
+    pattern = _CSS_REFERENCE if posixpath.splitext(rel_path)[1].lower() in STYLESHEET_SUFFIXES else _HTML_REFERENCE
+    base_dir = posixpath.dirname(rel_path)
+
+    def replace(match: re.Match) -> str:
+        groups = match.groups()
+        # Each alternative is (prefix, quote, url, suffix)
+        for i in range(0, len(groups), 4):
+            if groups[i] is not None:
+                prefix, _, url, suffix = groups[i:i + 4]
+                return prefix + _rewrite_url(url, base_dir, hashed) + suffix
+        return match.group(0)
+
+    return pattern.sub(replace, text)
+
+def _rewrite_file(path: Path, rel_path: str, hashed: Dict[str, str]):
+    try:
+        text = path.read_text(encoding="utf-8")
+    except (UnicodeDecodeError, OSError) as e:
+        logger.warning("Not rewriting asset references in {}: {}", rel_path, e)
+        return
+    rewritten = rewrite_references(text, rel_path, hashed)
+    if rewritten != text:
+        path.write_text(rewritten, encoding="utf-8")
+
+def fingerprint_site(site_dir: Path) -> Dict[str, str]:
+    """
+    Give every asset under site_dir a content-hashed copy next to it and point
+    the pages' src/href/poster attributes and the stylesheets' url()/@import
+    references at those copies. The originals stay, for references this does
+    not rewrite (script-built URLs, other sites linking in). Returns original
+    relative path -> fingerprinted relative path.
+    """
+    files = {
+        path.relative_to(site_dir).as_posix(): path
+        for path in sorted(site_dir.rglob("*"))
+        if path.is_file() and not path.is_symlink() and path.suffix.lower() not in VARIANT_SUFFIXES
+    }
+    hashed: Dict[str, str] = {}
+
+    def copy(rel_path: str, path: Path):
+        digest = _hash_file(path)
+        if f".{digest}" in posixpath.basename(rel_path):
+            # Already a fingerprinted copy, e.g. in a re-imported export
+            return
+        target = fingerprinted_name(rel_path, digest)
+        if target not in files:
+            try:
+                os.link(path, site_dir / target)
+            except FileExistsError:
+                pass
+        hashed[rel_path] = target
+
+    # Plain assets first, then stylesheets (whose url()s point at plain
+    # assets), then pages, which are never fingerprinted themselves
+    for rel_path, path in files.items():
+        if path.suffix.lower() not in PAGE_SUFFIXES | STYLESHEET_SUFFIXES:
+            copy(rel_path, path)
+    for rel_path, path in files.items():
+        if path.suffix.lower() in STYLESHEET_SUFFIXES:
+            _rewrite_file(path, rel_path, hashed)
+            copy(rel_path, path)
+    for rel_path, path in files.items():
+        if path.suffix.lower() in PAGE_SUFFIXES:
+            _rewrite_file(path, rel_path, hashed)
+    return hashed
@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from src.config import config
+from src.database import db
+from src.services.broadcast import broadcast
+
+# Key prefix for pages that list many apps (home page variants); any write
+# to any app can change them.
+LISTING = "listing"
+
+class PageCache:
+    """
+    LRU of rendered HTML pages, keyed by (slug or LISTING, variant).
+
+    Writes through Database invalidate the affected pages immediately, and in
+    other workers on their next broadcast poll. The TTL only bounds how stale
+    view counts can get, since those are bumped in memory without going
+    through a write listener.
+
+    Callers take generation(scope) before reading what they render and pass
+    it to put(), so a render that raced with an invalidation is not cached.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        # Bumped on invalidation, per scope and (by clear) for everything
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get(self, scope: str, variant: str = "") -> Optional[str]:
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get((scope, variant))
+            if entry is None:
+                return None
+            expires, html = entry
+            if expires < time.monotonic():
+                del self._entries[(scope, variant)]
+                return None
+            self._entries.move_to_end((scope, variant))
+            return html
+
+    def generation(self, scope: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(scope, 0)
+
+    def put(self, scope: str, variant: str, html: str, generation: Tuple[int, int]):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            if (self._epoch, self._generations.get(scope, 0)) != generation:
+                return
+            self._entries[(scope, variant)] = (time.monotonic() + self.ttl, html)
+            self._entries.move_to_end((scope, variant))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *slugs: str):
+        """Drop the pages for the slugs and every listing page."""
+        scopes = set(slugs) | {LISTING}
+        with self._lock:
+            for scope in scopes:
+                self._generations[scope] = self._generations.get(scope, 0) + 1
+            for key in [key for key in self._entries if key[0] in scopes]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+page_cache = PageCache(config.page_cache_ttl, config.page_cache_size)
+db.add_listener(lambda slugs: page_cache.invalidate(*slugs))
+broadcast.subscribe("app", page_cache.invalidate)
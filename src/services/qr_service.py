@@ -1,23 +1,89 @@
-import qrcode
 import io
 import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Tuple
 from src.config import config
+from src.utils.logger import logger
+from src.utils.metrics import QR_LATENCY, QR_REQUESTS
 
 class QRService:
+    MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+    # (data, box_size, format) key -> (image bytes, etag), least recently used first
+    _cache: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+    _lock = threading.Lock()
+
     @staticmethod
-    def generate_qr_base64(data: str) -> str:
+    def _render(data: str, box_size: int, fmt: str) -> bytes:
+        # qrcode pulls in PIL; only pay for that once a code is actually drawn
+        import qrcode
+        import qrcode.image.svg
+
         qr = qrcode.QRCode(
             version=1,
             error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
+            box_size=box_size,
             border=4,
         )
         qr.add_data(data)
         qr.make(fit=True)
 
+        if fmt == "svg":
+            img = qr.make_image(image_factory=qrcode.image.svg.SvgPathImage)
+            return img.to_string(encoding="unicode").encode("utf-8")
+
         img = qr.make_image(fill_color="black", back_color="white")
-        
         buffered = io.BytesIO()
         img.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        return buffered.getvalue()
+
+    @classmethod
+    def get_qr(cls, data: str, box_size: int = 10, fmt: str = "png") -> Tuple[bytes, str]:
+        """
+        Return (image bytes, strong etag) for a QR code, rendering it at most
+        once per (data, size, format) across the memory LRU and the disk cache.
+        """
+        if fmt not in cls.MEDIA_TYPES:
+            raise ValueError(f"Unsupported QR format: {fmt}")
+
+        key = hashlib.sha256(f"{box_size}:{fmt}:{data}".encode("utf-8")).hexdigest()
+        with cls._lock:
+            entry = cls._cache.get(key)
+            if entry is not None:
+                cls._cache.move_to_end(key)
+                QR_REQUESTS.inc(source="memory")
+                return entry
+
+        cache_dir = config.qr_cache_dir
+        disk_path = cache_dir / f"{key}.{fmt}"
+        try:
+            content = disk_path.read_bytes()
+            QR_REQUESTS.inc(source="disk")
+        except FileNotFoundError:
+            QR_REQUESTS.inc(source="render")
+            with QR_LATENCY.time(format=fmt):
+                content = cls._render(data, box_size, fmt)
+            try:
+                cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = cache_dir / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+                tmp_path.write_bytes(content)
+                os.replace(tmp_path, disk_path)
+            except OSError as e:
+                logger.warning(f"Failed to write QR cache file {disk_path}: {e}")
+
+        entry = (content, hashlib.sha256(content).hexdigest()[:32])
+        with cls._lock:
+            cls._cache[key] = entry
+            cls._cache.move_to_end(key)
+            while len(cls._cache) > config.qr_cache_size:
+                cls._cache.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def generate_qr_base64(data: str) -> str:
+        content, _ = QRService.get_qr(data)
+        img_str = base64.b64encode(content).decode()
         return f"data:image/png;base64,{img_str}"
@@ -0,0 +1,150 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+import aiofiles
+from src.config import config
+from src.services.site_index import COMPRESSIBLE_SUFFIXES, FileInfo
+from src.utils.logger import logger
+from src.utils.metrics import registry
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+class CachedFile(NamedTuple):
+    body: bytes
+    variants: Dict[str, bytes]  # content-coding -> encoded body
+    etag: str
+    last_modified: str
+    media_type: str
+    immutable: bool = False
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(v) for v in self.variants.values())
+
+class SiteCache:
+    """
+    Byte-bounded LRU of small hosted-site files, keyed by (slug, request path).
+
+    Entries hold the raw body plus any gzip/brotli variants that were written
+    at deploy time, so a hit is served without touching the filesystem.
+    """
+
+    def __init__(self, max_bytes: int, max_file_size: int):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self._entries: "OrderedDict[Tuple[str, str], CachedFile]" = OrderedDict()
+        self._size = 0
+        # Bumped on invalidation so a load that raced with a deploy is not cached
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, slug: str, path: str) -> Optional[CachedFile]:
+        with self._lock:
+            entry = self._entries.get((slug, path))
+            if entry is not None:
+                self._entries.move_to_end((slug, path))
+            return entry
+
+    def generation(self, slug: str) -> int:
+        return self._generations.get(slug, 0)
+
+    def put(self, slug: str, path: str, entry: CachedFile, generation: int):
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            if self._generations.get(slug, 0) != generation:
+                return
+            old = self._entries.pop((slug, path), None)
+            if old is not None:
+                self._size -= old.size
+            self._entries[(slug, path)] = entry
+            self._size += entry.size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+
+    def invalidate(self, slug: str):
+        with self._lock:
+            self._generations[slug] = self._generations.get(slug, 0) + 1
+            for key in [key for key in self._entries if key[0] == slug]:
+                self._size -= self._entries.pop(key).size
+
+    async def load(self, info: FileInfo) -> Optional[CachedFile]:
+        """Read a file and its precompressed variants, or None if it is too big to cache."""
+        if info.size > self.max_file_size:
+            return None
+
+        async with aiofiles.open(info.path, "rb") as f:
+            body = await f.read()
+
+        variants = {}
+        for encoding, path in info.variants.items():
+            try:
+                async with aiofiles.open(path, "rb") as f:
+                    variants[encoding] = await f.read()
+            except FileNotFoundError:
+                pass
+
+        return CachedFile(
+            body=body,
+            variants=variants,
+            etag=info.etag or hashlib.sha256(body).hexdigest()[:32],
+            last_modified=formatdate(info.mtime, usegmt=True),
+            media_type=info.media_type,
+            immutable=info.immutable,
+        )
+
+site_cache = SiteCache(config.site_cache_max_bytes, config.site_cache_max_file_size)
+registry.gauge("ahost_site_cache_bytes", "Bytes held by the hosted file cache", lambda: site_cache._size)
+
+def accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def compress_variants(name: str, data: bytes) -> Dict[str, bytes]:
+    """Encoded siblings (".gz", ".br") worth storing for a file, if any."""
+    if Path(name).suffix.lower() not in COMPRESSIBLE_SUFFIXES or len(data) < config.precompress_min_size:
+        return {}
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data)
+    return variants
+
+def precompress_site(site_dir: Path):
+    """
+    Write .gz (and .br when brotli is installed) siblings for compressible
+    files under site_dir.
+    """
+    paths = [
+        p for p in site_dir.rglob("*")
+        if p.is_file() and p.suffix.lower() not in (".gz", ".br")
+    ]
+    for path in paths:
+        if path.suffix.lower() not in COMPRESSIBLE_SUFFIXES:
+            continue
+        try:
+            for suffix, data in compress_variants(path.name, path.read_bytes()).items():
+                Path(f"{path}{suffix}").write_bytes(data)
+        except OSError as e:
+            logger.warning(f"Failed to precompress {path}: {e}")
@@ -0,0 +1,150 @@
+import asyncio
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import Dict, NamedTuple, Optional
+from src.config import config
+from src.services.blob_store import blob_store
+
+# Text-like assets worth storing precompressed next to the original
+COMPRESSIBLE_SUFFIXES = {
+    ".html", ".htm", ".css", ".js", ".mjs", ".json", ".map", ".svg",
+    ".txt", ".xml", ".csv", ".md", ".wasm",
+}
+
+def media_type_for(name: str, guessed: Optional[str] = None) -> str:
+    media_type = guessed or mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+        media_type += "; charset=utf-8"
+    return media_type
+
+class FileInfo(NamedTuple):
+    """Everything needed to serve a hosted file, resolved to where its bytes live."""
+    path: Path
+    size: int
+    mtime: float
+    media_type: str
+    etag: Optional[str]  # None when only known once the body has been read
+    variants: Dict[str, Path]  # content-coding -> path of the encoded body
+    immutable: bool = False  # a fingerprinted copy, whose URL never changes content
+
+    @classmethod
+    def from_stat(cls, file_path: Path, stat: os.stat_result) -> "FileInfo":
+        variants = {}
+        if file_path.suffix.lower() in COMPRESSIBLE_SUFFIXES:
+            # Only trust siblings we could have written ourselves
+            variants = {"br": Path(f"{file_path}.br"), "gzip": Path(f"{file_path}.gz")}
+        return cls(file_path, stat.st_size, stat.st_mtime, media_type_for(file_path.name), None, variants)
+
+class SiteManifest:
+    """The current version of one slug, keyed by normalized request path."""
+
+    def __init__(self, manifest: Optional[dict] = None):
+        self.version = manifest["version"] if manifest else None
+        self.files: Dict[str, FileInfo] = {}
+        if not manifest:
+            return
+
+        # Manifests written before entries carried an mtime fall back to the deploy time
+        deployed = datetime.fromisoformat(manifest["created_at"]).timestamp()
+        entries = manifest["files"]
+        for rel_path, entry in entries.items():
+            variants = {}
+            if PurePosixPath(rel_path).suffix.lower() in COMPRESSIBLE_SUFFIXES:
+                for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                    sibling = entries.get(rel_path + suffix)
+                    if sibling:
+                        variants[encoding] = blob_store.blob_path(sibling["hash"])
+            self.files[rel_path] = FileInfo(
+                path=blob_store.blob_path(entry["hash"]),
+                size=entry["size"],
+                mtime=entry.get("mtime", deployed),
+                media_type=media_type_for(rel_path, entry.get("type")),
+                etag=entry["hash"][:32],
+                variants=variants,
+                immutable=entry.get("immutable", False),
+            )
+
+    def resolve(self, path: str) -> Optional[FileInfo]:
+        """The file served for a request path, following directories to their index.html."""
+        key = PurePosixPath(path).as_posix() if path else "."
+        info = self.files.get(key)
+        if info is None:
+            info = self.files.get("index.html" if key == "." else f"{key}/index.html")
+        return info
+
+class SiteIndex:
+    """
+    LRU of per-slug manifests, so hosted files are resolved, 404'd and given
+    their headers without touching the filesystem. Slugs deployed before the
+    blob store existed have no manifest and map to None: serve those from disk.
+
+    Unknown slugs are remembered apart, in a smaller LRU whose entries expire
+    after MISSING_TTL seconds, so requests for random slugs cannot evict the
+    real sites.
+    """
+
+    MISSING_TTL = 30.0
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.max_missing = max(64, max_entries // 4)
+        self._entries: "OrderedDict[str, Optional[SiteManifest]]" = OrderedDict()
+        # Unknown slug -> when to check the disk again
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+        # Bumped on invalidation so a load that raced with a deploy is not kept
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, slug: str) -> Optional[SiteManifest]:
+        with self._lock:
+            if slug in self._entries:
+                self._entries.move_to_end(slug)
+                return self._entries[slug]
+            expires = self._missing.get(slug)
+            if expires is not None:
+                if expires > time.monotonic():
+                    return _MISSING
+                del self._missing[slug]
+            generation = self._generations.get(slug, 0)
+
+        site = await asyncio.to_thread(self._load, slug)
+        with self._lock:
+            if self._generations.get(slug, 0) == generation:
+                if site is _MISSING:
+                    self._missing[slug] = time.monotonic() + self.MISSING_TTL
+                    self._missing.move_to_end(slug)
+                    while len(self._missing) > self.max_missing:
+                        self._missing.popitem(last=False)
+                else:
+                    self._entries[slug] = site
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return site
+
+    def invalidate(self, slug: str):
+        with self._lock:
+            self._generations[slug] = self._generations.get(slug, 0) + 1
+            self._entries.pop(slug, None)
+            self._missing.pop(slug, None)
+
+    @staticmethod
+    def _load(slug: str) -> Optional[SiteManifest]:
+        if slug in (".", ".."):
+            return _MISSING
+        manifest = blob_store.current_manifest(slug)
+        if manifest is not None:
+            return SiteManifest(manifest)
+        if (config.upload_dir / slug).is_dir():
+            return None
+        # Unknown slug: an empty manifest 404s every path from memory
+        return _MISSING
+
+# Shared by every unknown slug; never modified
+_MISSING = SiteManifest()
+
+site_index = SiteIndex(config.site_index_size)
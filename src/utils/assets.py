@@ -0,0 +1,163 @@
+"""
+Minifiers and image recompression used by the upload-time asset optimizer.
+
+Kept free of application imports: optimize_file runs in spawned pool
+processes, which import this module on their own.
+"""
+import io
+import re
+from pathlib import Path
+from typing import Optional, Tuple
+
+# Optional, better minifiers; without them JS is left alone and CSS gets the
+# conservative built-in pass below
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+HTML_SUFFIXES = {".html", ".htm"}
+CSS_SUFFIXES = {".css"}
+JS_SUFFIXES = {".js", ".mjs"}
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg"}
+OPTIMIZABLE_SUFFIXES = HTML_SUFFIXES | CSS_SUFFIXES | JS_SUFFIXES | IMAGE_SUFFIXES
+
+_CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)|(\s+)', re.S)
+# Whitespace next to these never matters in CSS. "(" is not here on purpose:
+# "@media screen and (...)" needs its space.
+_CSS_TIGHT = set("{};,>")
+
+_CSS_EMPTY_DECLARATION = re.compile(r";+}")
+
+def minify_css(text: str) -> str:
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    out = []
+    # Text since the last string literal; ";}" is only collapsed outside strings
+    run = []
+    # Last character kept so far, to tell whether a run of whitespace matters
+    previous = ""
+    position = 0
+    for match in _CSS_TOKENS.finditer(text):
+        chunk = text[position:match.start()]
+        run.append(chunk)
+        previous = chunk[-1:] or previous
+        position = match.end()
+        string, comment, space = match.groups()
+        if string:
+            out.append(_CSS_EMPTY_DECLARATION.sub("}", "".join(run)))
+            out.append(string)
+            run = []
+            previous = string[-1]
+        elif comment:
+            if comment.startswith("/*!"):  # license comments stay
+                run.append(comment)
+                previous = "/"
+        elif space:
+            following = text[match.end():match.end() + 1]
+            if previous.strip() and following and previous not in _CSS_TIGHT and following not in _CSS_TIGHT:
+                run.append(" ")
+                previous = " "
+    run.append(text[position:])
+    out.append(_CSS_EMPTY_DECLARATION.sub("}", "".join(run)))
+    return "".join(out).strip()
+
+def minify_js(text: str) -> Optional[str]:
+    # Whitespace in JS is only safe to touch with a real tokenizer
+    if rjsmin is None:
+        return None
+    return rjsmin.jsmin(text)
+
+_HTML_RAW = re.compile(r"<(pre|textarea|script|style)\b[^>]*>.*?</\1\s*>", re.I | re.S)
+_HTML_COMMENT = re.compile(r"<!--(?!\[if|<!|>).*?-->", re.S)
+_JS_TYPE = re.compile(r"""\btype\s*=\s*["']?(?!(?:text/javascript|module|application/javascript)\b)""", re.I)
+
+def _minify_raw_block(block: str) -> str:
+    tag = block[1:block.index(">")]
+    name = tag.split(None, 1)[0].lower()
+    open_end = block.index(">") + 1
+    close_start = block.lower().rindex("</")
+    body = block[open_end:close_start]
+    if name == "style":
+        body = minify_css(body)
+    elif name == "script" and not _JS_TYPE.search(tag) and body.strip():
+        body = minify_js(body) or body
+    return block[:open_end] + body + block[close_start:]
+
+def minify_html(text: str) -> str:
+    """
+    Drop comments and indentation between tags. Runs of whitespace around a
+    line break become one newline, which renders the same as the original;
+    <pre>, <textarea>, <script> and <style> content is left alone apart from
+    minifying inline CSS/JS.
+    """
+    out = []
+    position = 0
+    for match in _HTML_RAW.finditer(text):
+        out.append(_minify_markup(text[position:match.start()]))
+        out.append(_minify_raw_block(match.group(0)))
+        position = match.end()
+    out.append(_minify_markup(text[position:]))
+    return "".join(out).strip()
+
+def _minify_markup(text: str) -> str:
+    text = _HTML_COMMENT.sub("", text)
+    return re.sub(r"[ \t\r\f\v]*\n\s*", "\n", text)
+
+def recompress_image(data: bytes, suffix: str, jpeg_quality: int, max_dimension: int) -> Optional[bytes]:
+    """Re-encode without metadata (keeping the colour profile), downscaled to max_dimension."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as original:
+        if getattr(original, "is_animated", False):
+            return None
+        icc_profile = original.info.get("icc_profile")
+        # Bake in the EXIF rotation, since the EXIF block is about to go
+        image = ImageOps.exif_transpose(original)
+        if max_dimension and max(image.size) > max_dimension:
+            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+        out = io.BytesIO()
+        if suffix == ".png":
+            image.save(out, "PNG", optimize=True, icc_profile=icc_profile)
+        else:
+            if image.mode not in ("RGB", "L"):
+                return None
+            image.save(out, "JPEG", quality=jpeg_quality, optimize=True, progressive=True,
+                       icc_profile=icc_profile)
+        return out.getvalue()
+
+def optimize_file(path: str, jpeg_quality: int, max_dimension: int) -> Optional[Tuple[int, int]]:
+    """
+    Runs in a pool process. Writes the optimized version of path next to it
+    as path + ".opt" and returns (bytes before, bytes after), or None when
+    nothing smaller came out.
+    """
+    suffix = Path(path).suffix.lower()
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        if suffix in IMAGE_SUFFIXES:
+            optimized = recompress_image(data, suffix, jpeg_quality, max_dimension)
+        else:
+            text = data.decode("utf-8")
+            if suffix in HTML_SUFFIXES:
+                result = minify_html(text)
+            elif suffix in CSS_SUFFIXES:
+                result = minify_css(text)
+            else:
+                result = minify_js(text)
+            optimized = result.encode("utf-8") if result is not None else None
+    except Exception:
+        # Not valid UTF-8, not an image PIL understands, ...: serve it as uploaded
+        return None
+
+    if optimized is None or len(optimized) >= len(data):
+        return None
+    with open(f"{path}.opt", "wb") as f:
+        f.write(optimized)
+    return len(data), len(optimized)
@@ -0,0 +1,84 @@
+"""
+HyperLogLog cardinality sketches, for counting unique visitors without
+keeping who they were. A sketch has 2**PRECISION registers (about 1.6%
+standard error), and sketches of different periods merge into the sketch
+of their union.
+
+Serialized, a sketch with few registers set is sparse: 3 bytes (index,
+rank) per set register, so a quiet hour costs a few hundred bytes. Once
+that would be larger than the registers themselves it is stored dense, as
+exactly REGISTERS bytes; the length tells the two apart.
+"""
+import hashlib
+import math
+import re
+from typing import Iterable, Optional
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+_REST_BITS = 64 - PRECISION
+_REST_MASK = (1 << _REST_BITS) - 1
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+# Largest number of set registers still stored sparse (and shorter than dense)
+_SPARSE_MAX = (REGISTERS - 1) // 3
+_SET_REGISTER = re.compile(b"[^\x00]")
+
+class HyperLogLog:
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: Optional[bytes] = None):
+        if registers is not None and len(registers) != REGISTERS:
+            raise ValueError(f"Expected {REGISTERS} registers, got {len(registers)}")
+        self.registers = bytearray(registers) if registers is not None else bytearray(REGISTERS)
+
+    def add(self, value: bytes):
+        h = int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "big")
+        index = h >> _REST_BITS
+        # Position of the first 1 bit in what is left of the hash
+        rank = _REST_BITS - (h & _REST_MASK).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        estimate = _ALPHA * REGISTERS * REGISTERS / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * REGISTERS and zeros:
+            # Small counts: linear counting over the empty registers is more accurate
+            estimate = REGISTERS * math.log(REGISTERS / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        if REGISTERS - self.registers.count(0) > _SPARSE_MAX:
+            return bytes(self.registers)
+        sparse = bytearray()
+        # The regex scan skips the empty registers in C
+        for match in _SET_REGISTER.finditer(self.registers):
+            sparse += match.start().to_bytes(2, "big")
+            sparse += match.group()
+        return bytes(sparse)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        if len(data) == REGISTERS:
+            return cls(data)
+        if len(data) % 3 or len(data) > 3 * _SPARSE_MAX:
+            raise ValueError(f"Invalid sketch of {len(data)} bytes")
+        sketch = cls()
+        registers = sketch.registers
+        for offset in range(0, len(data), 3):
+            index = int.from_bytes(data[offset:offset + 2], "big")
+            if index >= REGISTERS:
+                raise ValueError(f"Invalid register index {index}")
+            registers[index] = max(registers[index], data[offset + 2])
+        return sketch
+
+    @classmethod
+    def union(cls, sketches: Iterable[Optional[bytes]]) -> "HyperLogLog":
+        merged = cls()
+        for sketch in sketches:
+            if sketch:
+                merged.merge(cls.from_bytes(sketch))
+        return merged
@@ -0,0 +1,192 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Default latency buckets in seconds, from a fast cache hit to a slow upload
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+class Gauge(Metric):
+    """A value read from a callback at scrape time, so nothing is paid on the hot path."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, callback: Callable[[], float]):
+        super().__init__(name, help)
+        self.callback = callback
+
+    def samples(self) -> Iterable[str]:
+        yield f"{self.name} {_number(self.callback())}"
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+    def __call__(self, func):
+        """Use as a decorator; works for both plain and async functions."""
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _Timer(self.histogram, self.labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.histogram, self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, callback: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, help, callback))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+registry = Registry()
+
+# Metrics shared across modules are declared here so every name is in one place
+HTTP_REQUESTS = registry.counter(
+    "ahost_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+HTTP_LATENCY = registry.histogram(
+    "ahost_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"))
+DB_LATENCY = registry.histogram(
+    "ahost_db_query_duration_seconds", "Database method latency", ("method",))
+SITE_BYTES = registry.counter(
+    "ahost_site_bytes_served_total", "Bytes of hosted site content sent, by slug", ("slug",))
+SITE_CACHE = registry.counter(
+    "ahost_site_cache_requests_total", "Hosted file lookups by site cache result", ("result",))
+UPLOAD_LATENCY = registry.histogram(
+    "ahost_upload_duration_seconds", "Upload processing time by stage", ("stage",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+ASSET_BYTES = registry.counter(
+    "ahost_asset_optimizer_bytes_total", "Bytes of optimized uploaded assets, before and after", ("stage",))
+QR_REQUESTS = registry.counter(
+    "ahost_qr_requests_total", "QR code lookups by cache layer that served them", ("source",))
+QR_LATENCY = registry.histogram(
+    "ahost_qr_render_duration_seconds", "QR code render time", ("format",))
+SHED_REQUESTS = registry.counter(
+    "ahost_shed_requests_total", "Requests turned away by rate limits (rate) and concurrency caps (busy)",
+    ("rule", "reason"))
+CF_PURGES = registry.counter(
+    "ahost_cloudflare_purge_batches_total", "Cloudflare purge batch attempts by outcome", ("result",))
+CF_LATENCY = registry.histogram(
+    "ahost_cloudflare_purge_duration_seconds", "Cloudflare purge API call latency")
+
+def timed(histogram: Histogram, label: str = "method"):
+    """Decorator recording a method's latency under its own name."""
+    def decorator(func):
+        return _Timer(histogram, {label: func.__name__.lstrip("_")})(func)
+    return decorator
@@ -0,0 +1,196 @@
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+from starlette.responses import JSONResponse
+from src.config import config
+from src.utils.metrics import SHED_REQUESTS, registry
+
+class TokenBucketLimiter:
+    """
+    Token buckets keyed by (rule, client). Each bucket holds up to `burst`
+    tokens and refills at `per_minute`; a request takes one. Idle buckets are
+    full anyway, so only the most recently used RATE_LIMIT_MAX_CLIENTS are kept.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._buckets: "OrderedDict[Tuple[str, str], Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: Tuple[str, str], per_minute: float, burst: float) -> float:
+        """Take a token; returns 0 if there was one, otherwise seconds until there is."""
+        rate = per_minute / 60
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate if rate > 0 else 60.0
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return wait
+
+class ConcurrencyLimiter:
+    """
+    Cap on concurrent heavy operations. Does not queue: once `limit` are
+    running, acquire() fails straight away, so excess work is shed instead
+    of piling up behind the ones in progress.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.active = 0
+
+    @property
+    def limit(self) -> int:
+        return config.max_concurrent_uploads
+
+    def acquire(self) -> bool:
+        # Only touched from the event loop, so no lock is needed
+        if self.active >= self.limit:
+            return False
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+
+def _compile(template: str) -> Pattern:
+    """"/api/comment/{slug}" -> a regex matching the paths of that route."""
+    parts = re.split(r"(\{[^}]+\})", template)
+    return re.compile("".join(
+        ("[^/]+" if not part.endswith(":path}") else ".*") if part.startswith("{") else re.escape(part)
+        for part in parts
+    ) + "$")
+
+def client_ip(scope) -> str:
+    """The client's address, from RATE_LIMIT_IP_HEADER when behind a proxy."""
+    header = config.rate_limit_ip_header.lower().encode("latin-1")
+    if header:
+        entries = [
+            entry.strip()
+            for name, value in scope.get("headers") or () if name == header
+            for entry in value.decode("latin-1").split(",")
+        ]
+        if entries:
+            # The client can put anything at the left of X-Forwarded-For; only
+            # the entries our own proxies appended on the right are trustworthy
+            return entries[max(0, len(entries) - config.rate_limit_proxy_hops)]
+    client = scope.get("client")
+    return client[0] if client else ""
+
+class RateLimitMiddleware:
+    """
+    Per-client, per-route token-bucket limits, answered with a 429 and a
+    Retry-After before the request body is read. RATE_LIMITS maps
+    "METHOD /route/{template}" to {"per_minute": n, "burst": n}. Buckets live
+    in each worker process, so with N workers a client gets up to N times
+    the configured rate.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._rules: List[Tuple[str, str, Pattern]] = []
+        self._rules_source: Optional[Dict] = None
+
+    def _match(self, method: str, path: str) -> Optional[str]:
+        limits = config.rate_limits
+        if limits is not self._rules_source:
+            # Rebuilt when config.json is reloaded
+            self._rules = []
+            for rule in limits:
+                rule_method, _, template = rule.partition(" ")
+                self._rules.append((rule, rule_method.upper(), _compile(template)))
+            self._rules_source = limits
+        for rule, rule_method, pattern in self._rules:
+            if rule_method == method and pattern.match(path):
+                return rule
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.rate_limit:
+            await self.app(scope, receive, send)
+            return
+
+        rule = self._match(scope["method"], scope["path"])
+        if rule is not None:
+            limit = config.rate_limits[rule]
+            wait = limiter.hit((rule, client_ip(scope)), float(limit["per_minute"]), float(limit["burst"]))
+            if wait > 0:
+                SHED_REQUESTS.inc(rule=rule, reason="rate")
+                response = JSONResponse(
+                    {"detail": "Too many requests, please slow down"},
+                    status_code=429,
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+# Routes that take a heavy_operations slot, with the size limit of their body
+HEAVY_ROUTES: Dict[str, Callable[[], int]] = {
+    "POST /api/upload": lambda: config.max_upload_size,
+    "POST /admin/api/import": lambda: config.import_max_size,
+}
+# Multipart framing and the other form fields, on top of the file itself
+FORM_OVERHEAD = 1024 * 1024
+
+class HeavyOperationMiddleware:
+    """
+    Uploads and imports, checked before their body is read: one whose
+    Content-Length is over the size limit gets a 413, and once
+    MAX_CONCURRENT_UPLOADS are in progress the rest get a 503 and a
+    Retry-After, rather than each spooling a multipart body to disk first.
+    The slot is held until the response is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes = []
+        for rule, max_size in HEAVY_ROUTES.items():
+            method, _, template = rule.partition(" ")
+            self._routes.append((rule, method, _compile(template), max_size))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        for rule, method, pattern, max_size in self._routes:
+            if method == scope["method"] and pattern.match(scope["path"]):
+                break
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        length = next((value for name, value in scope.get("headers") or () if name == b"content-length"), b"")
+        if length.isdigit() and int(length) > max_size() + FORM_OVERHEAD:
+            SHED_REQUESTS.inc(rule=rule, reason="size")
+            response = JSONResponse({"detail": "Upload is too large"}, status_code=413)
+            await response(scope, receive, send)
+            return
+        if not heavy_operations.acquire():
+            SHED_REQUESTS.inc(rule=heavy_operations.name, reason="busy")
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry shortly"},
+                status_code=503,
+                headers={"Retry-After": str(config.busy_retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            heavy_operations.release()
+
+limiter = TokenBucketLimiter(config.rate_limit_max_clients)
+# Uploads, extractions and bulk imports share one cap
+heavy_operations = ConcurrencyLimiter("upload")
+registry.gauge("ahost_heavy_operations_active", "Uploads and imports being processed", lambda: heavy_operations.active)
@@ -0,0 +1,18 @@
+import jinja2
+from fastapi.templating import Jinja2Templates
+from src.config import config
+
+def create_templates() -> Jinja2Templates:
+    """
+    The one template environment shared by every router. Compiled templates
+    are kept in a bytecode cache on disk so a restart does not recompile them.
+    """
+    config.template_cache_dir.mkdir(parents=True, exist_ok=True)
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader("templates"),
+        autoescape=True,
+        bytecode_cache=jinja2.FileSystemBytecodeCache(str(config.template_cache_dir)),
+    )
+    return Jinja2Templates(env=env)
+
+templates = create_templates()